@@ -4,18 +4,40 @@ from django.contrib.admin.widgets import AdminDateWidget
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.forms import UserChangeForm
 from django.contrib.auth.models import User
+from django.db.models import Count
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.forms import TextInput, ModelForm, Textarea, Select
+from django.utils.text import Truncator
 from reversion import VersionAdmin
 from import_export.admin import ImportExportModelAdmin
 from suit_ckeditor.widgets import CKEditorWidget
 from suit_redactor.widgets import RedactorWidget
+from .caching import CachedChangeListMixin, get_changelist_cache
+from .choices import CachedSelect, CachedLinkedSelect, NameIndex
+from .counts import EstimatedCountMixin
+from .dates import DateHistogram
+from .editables import BulkListEditableMixin
+from .exports import StreamingExportMixin
+from .history import PaginatedHistoryMixin
+from .imports import BulkModelResource
+from .inlines import PaginatedInlineMixin
+from .jobs import BackgroundJobMixin
+from .profiling import ProfilingMixin
+from .search import SearchTextMixin
+from .serializers import FORMAT as DELTA_FORMAT
+from .signals import rows_changed
+from .sortables import BulkReorderMixin, BulkSortableInlineMixin
+from .tabs import LazyInlineTabsMixin
+from .trees import LazyTreeMixin
 from .models import Country, Continent, KitchenSink, Category, City, \
     Microwave, Fridge, WysiwygEditor, ReversionedItem, ImportExportItem
 from suit.admin import SortableTabularInline, SortableModelAdmin, \
     SortableStackedInline
 from suit.widgets import SuitDateWidget, SuitSplitDateTimeWidget, \
-    EnclosedInput, LinkedSelect, AutosizedTextarea
+    EnclosedInput, AutosizedTextarea
 from django_select2 import AutoModelSelect2Field, AutoHeavySelect2Widget
+from django_select2.views import NO_ERR_RESP
 from mptt.admin import MPTTModelAdmin
 
 
@@ -29,23 +51,32 @@ class CountryInlineForm(ModelForm):
         }
 
 
-class CountryInline(SortableTabularInline):
+class CountryInline(PaginatedInlineMixin, BulkSortableInlineMixin,
+                    SortableTabularInline):
     form = CountryInlineForm
     model = Country
     fields = ('name', 'code', 'population',)
     extra = 1
+    inline_search_fields = ('name', 'code')
     verbose_name_plural = 'Countries (Sortable example)'
     sortable = 'order'
 
 
-class ContinentAdmin(SortableModelAdmin):
+class ContinentAdmin(ProfilingMixin, CachedChangeListMixin, BulkReorderMixin,
+                     SortableModelAdmin):
     search_fields = ('name',)
     list_display = ('name', 'countries')
     inlines = (CountryInline,)
     sortable = 'order'
+    cache_related_models = (Country,)
+
+    def queryset(self, request):
+        qs = super(ContinentAdmin, self).queryset(request)
+        return qs.annotate(countries_count=Count('country'))
 
     def countries(self, obj):
-        return len(obj.country_set.all())
+        return obj.countries_count
+    countries.admin_order_field = 'countries_count'
 
     def suit_row_attributes(self, obj):
         class_map = {
@@ -82,10 +113,11 @@ class CityInlineForm(ModelForm):
         }
 
 
-class CityInline(admin.TabularInline):
+class CityInline(PaginatedInlineMixin, admin.TabularInline):
     form = CityInlineForm
     model = City
     extra = 3
+    inline_search_fields = ('name',)
     verbose_name_plural = 'Cities'
     suit_classes = 'suit-tab suit-tab-cities'
 
@@ -108,13 +140,17 @@ class CountryForm(ModelForm):
         }
 
 
-class CountryAdmin(ModelAdmin):
+class CountryAdmin(ProfilingMixin, EstimatedCountMixin, SearchTextMixin,
+                   CachedChangeListMixin, LazyInlineTabsMixin, ModelAdmin):
     form = CountryForm
-    search_fields = ('name', 'code')
+    # Searches name and code, see SearchTextModel
+    search_fields = ('search_text',)
     list_display = ('name', 'code', 'continent', 'independence_day')
     list_filter = ('continent',)
     date_hierarchy = 'independence_day'
+    date_histogram = DateHistogram(Country, 'independence_day')
     list_select_related = True
+    cache_related_models = (Continent,)
 
     inlines = (CityInline,)
 
@@ -161,8 +197,16 @@ class CountryFilter(SimpleListFilter):
     def lookups(self, request, model_admin):
         # You can use also "Country" instead of "model_admin.model"
         # if this is not direct relation
-        countries = set([c.country for c in model_admin.model.objects.all()])
-        return [(c.id, c.name) for c in countries]
+        cache = get_changelist_cache()
+        key = country_lookups_cache_key(model_admin.model)
+        lookups = cache.get(key) if cache is not None else None
+        if lookups is None:
+            lookups = list(model_admin.model.objects
+                           .values_list('country_id', 'country__name')
+                           .order_by('country__name').distinct())
+            if cache is not None:
+                cache.set(key, lookups)
+        return lookups
 
     def queryset(self, request, queryset):
         if self.value():
@@ -171,6 +215,35 @@ class CountryFilter(SimpleListFilter):
             return queryset
 
 
+def country_lookups_cache_key(model):
+    return 'examples:country_lookups:%s' % model._meta.object_name.lower()
+
+
+# Lookups are cached in the shared changelist cache only, so invalidation
+# reaches every worker
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=KitchenSink)
+@receiver(post_delete, sender=KitchenSink)
+@receiver(rows_changed, sender=City)
+@receiver(rows_changed, sender=KitchenSink)
+def invalidate_country_lookups(sender, **kwargs):
+    cache = get_changelist_cache()
+    if cache is not None:
+        cache.delete(country_lookups_cache_key(sender))
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+@receiver(rows_changed, sender=Country)
+def invalidate_all_country_lookups(sender, **kwargs):
+    # Country names are part of the cached lookups
+    cache = get_changelist_cache()
+    if cache is not None:
+        cache.delete_many([country_lookups_cache_key(model)
+                           for model in (City, KitchenSink)])
+
+
 class KitchenSinkForm(ModelForm):
     class Meta:
         widgets = {
@@ -179,7 +252,8 @@ class KitchenSinkForm(ModelForm):
             'date_widget': SuitDateWidget,
             'datetime_widget': SuitSplitDateTimeWidget,
             'textfield': AutosizedTextarea(attrs={'rows': '2'}),
-            'linked_foreign_key': LinkedSelect,
+            'country': CachedSelect,
+            'linked_foreign_key': CachedLinkedSelect,
 
             'enclosed1': EnclosedInput(append='icon-plane',
                                        attrs={'class': 'input-medium'}),
@@ -202,25 +276,27 @@ class FridgeInlineForm(ModelForm):
         }
 
 
-class FridgeInline(SortableTabularInline):
+class FridgeInline(BulkSortableInlineMixin, SortableTabularInline):
     model = Fridge
     form = FridgeInlineForm
     extra = 1
     verbose_name_plural = 'Fridges (Tabular inline)'
 
 
-class MicrowaveInline(SortableStackedInline):
+class MicrowaveInline(BulkSortableInlineMixin, SortableStackedInline):
     model = Microwave
     extra = 1
     verbose_name_plural = 'Microwaves (Stacked inline)'
 
 
 # Kitchen sink model admin
-class KitchenSinkAdmin(admin.ModelAdmin):
+class KitchenSinkAdmin(ProfilingMixin, BulkListEditableMixin,
+                       EstimatedCountMixin, SearchTextMixin, admin.ModelAdmin):
     raw_id_fields = ()
     form = KitchenSinkForm
     inlines = (FridgeInline, MicrowaveInline)
-    search_fields = ['name']
+    # Searches name, see SearchTextModel
+    search_fields = ['search_text']
     radio_fields = {"horizontal_choices": admin.HORIZONTAL,
                     'vertical_choices': admin.VERTICAL}
     list_editable = ('boolean', )
@@ -265,8 +341,8 @@ class KitchenSinkAdmin(admin.ModelAdmin):
         """
         Set extra=0 for inlines if object already exists
         """
-        for inline in self.get_inline_instances(request):
-            formset = inline.get_formset(request, obj)
+        for formset in super(KitchenSinkAdmin, self).get_formsets(request,
+                                                                obj):
             if obj:
                 formset.extra = 0
             yield formset
@@ -288,7 +364,7 @@ class SuitUserChangeForm(UserChangeForm):
         }
 
 
-class SuitAdminUser(UserAdmin):
+class SuitAdminUser(ProfilingMixin, UserAdmin):
     form = SuitUserChangeForm
 
     def queryset(self, request):
@@ -315,18 +391,36 @@ admin.site.register(User, SuitAdminUser)
 # Django-mptt
 # https://github.com/django-mptt/django-mptt/
 #
-class CategoryAdmin(MPTTModelAdmin, SortableModelAdmin):
+class CategoryAdmin(ProfilingMixin, BulkListEditableMixin, BulkReorderMixin,
+                    LazyTreeMixin, MPTTModelAdmin, SortableModelAdmin):
     """
     Example of django-mptt and sortable together. Important note:
-    If used together MPTTModelAdmin must be before SortableModelAdmin
+    If used together MPTTModelAdmin must be before SortableModelAdmin.
+    LazyTreeMixin renders root nodes only and loads children on expand
     """
     mptt_level_indent = 20
+    # First column is the tree toggle of LazyTreeMixin
+    mptt_indent_field = 'name'
     search_fields = ('name', 'slug')
     prepopulated_fields = {'slug': ('name',)}
     list_display = ('name', 'slug', 'is_active')
     list_editable = ('is_active',)
     list_display_links = ('name',)
     sortable = 'order'
+    # Order is written by reorder/ only, which moves nodes in the tree
+    bulk_editable = ('is_active',)
+    reorder_scope = ('parent',)
+
+    def after_reorder(self, objects):
+        # Sibling order is stored in the tree, rebuild it from the written
+        # order values. Root order is the order of trees, which only a full
+        # rebuild renumbers. Writes were updates, which delay_mptt_updates
+        # doesn't track, so rebuilds are run here
+        if any(obj.parent_id is None for obj in objects):
+            Category.objects.rebuild()
+            return
+        for tree_id in set(obj.tree_id for obj in objects):
+            Category.objects.partial_rebuild(tree_id)
 
 
 admin.site.register(Category, CategoryAdmin)
@@ -337,8 +431,19 @@ admin.site.register(Category, CategoryAdmin)
 # https://github.com/applegrew/django-select2
 #
 class CountryChoices(AutoModelSelect2Field):
+    """
+    Pages through matches of the in-memory country name index instead of
+    running a query on every keystroke. Terms match starts of name words
+    """
     queryset = Country.objects
-    search_fields = ['name__icontains', ]
+    search_fields = ['name__istartswith', ]
+    max_results = 25
+    name_index = NameIndex(Country)
+
+    def get_results(self, request, term, page, context):
+        has_more, matches = self.name_index.search(
+            term, (page - 1) * self.max_results, self.max_results)
+        return NO_ERR_RESP, has_more, [(pk, name, {}) for pk, name in matches]
 
 
 class CityForm(ModelForm):
@@ -367,9 +472,11 @@ class CityForm(ModelForm):
         }
 
 
-class CityAdmin(ModelAdmin):
+class CityAdmin(ProfilingMixin, EstimatedCountMixin, SearchTextMixin,
+                ModelAdmin):
     form = CityForm
-    search_fields = ('name', 'country__name')
+    # Searches name and country name, see SearchTextModel
+    search_fields = ('search_text',)
     list_display = ('name', 'country', 'capital', 'continent')
     list_filter = (CountryFilter, 'capital')
     fieldsets = [
@@ -379,8 +486,15 @@ class CityAdmin(ModelAdmin):
             'fields': ['area', 'population']}),
     ]
 
+    def queryset(self, request):
+        # Country.continent is nullable, so list_select_related = True would
+        # stop at country and fetch each continent lazily
+        qs = super(CityAdmin, self).queryset(request)
+        return qs.select_related('country__continent')
+
     def continent(self, obj):
         return obj.country.continent
+    continent.admin_order_field = 'country__continent__name'
 
 
 admin.site.register(City, CityAdmin)
@@ -415,10 +529,10 @@ class WysiwygEditorForm(ModelForm):
         }
 
 
-class WysiwygEditorAdmin(ModelAdmin):
+class WysiwygEditorAdmin(ProfilingMixin, SearchTextMixin, ModelAdmin):
     form = WysiwygEditorForm
-    search_fields = ('name',)
-    list_display = ('name',)
+    search_fields = ('search_text',)
+    list_display = ('name', 'preview')
     fieldsets = [
         (None, {'fields': ['name', 'redactor']}),
 
@@ -430,14 +544,32 @@ class WysiwygEditorAdmin(ModelAdmin):
         ('CK Editor', {
             'classes': ('full-width',),
             'description': 'CKEditor 4.x custom toolbar configuration example',
-            'fields': ['ckeditor']})
+            'fields': ['ckeditor']}),
+
+        ('Rendered', {
+            'classes': ('full-width',),
+            'description': 'Sanitized html stored on save',
+            'fields': ['rendered_html']}),
     ]
+    readonly_fields = ('rendered_html',)
+
+    def preview(self, obj):
+        return Truncator(obj.text).chars(80)
+
+    def rendered_html(self, obj):
+        # Stored _html fields are sanitized already, nothing is parsed here
+        return ''.join(getattr(obj, '%s_html' % name)
+                       for name in obj.rich_text_fields)
+    rendered_html.allow_tags = True
+    rendered_html.short_description = 'Rendered html'
 
 
 admin.site.register(WysiwygEditor, WysiwygEditorAdmin)
 
 
-class ReversionedItemAdmin(VersionAdmin):
+class ReversionedItemAdmin(ProfilingMixin, PaginatedHistoryMixin,
+                           VersionAdmin):
+    reversion_format = DELTA_FORMAT
     search_fields = ('name',)
     list_display = ('name', 'quality', 'is_active')
 
@@ -445,7 +577,18 @@ class ReversionedItemAdmin(VersionAdmin):
 admin.site.register(ReversionedItem, ReversionedItemAdmin)
 
 
-class ImportExportDemoAdmin(ImportExportModelAdmin):
+class ImportExportItemResource(BulkModelResource):
+    natural_key = 'name'
+
+    class Meta:
+        model = ImportExportItem
+
+
+class ImportExportDemoAdmin(ProfilingMixin, BackgroundJobMixin,
+                            StreamingExportMixin, ImportExportModelAdmin):
+    resource_class = ImportExportItemResource
+    change_list_template = 'admin/examples/importexportitem/change_list.html'
+    import_template_name = 'admin/examples/importexportitem/import.html'
     search_fields = ('name',)
     list_display = ('name', 'quality', 'is_active')
 
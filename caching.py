@@ -0,0 +1,155 @@
+"""
+Rendered changelist cache.
+
+CachedChangeListMixin stores rendered changelist pages per user and GET
+parameters. Every cache key includes generation counters of the model and
+of cache_related_models, which are bumped on their post_save/post_delete,
+so any change of listed data invalidates cached pages at once.
+
+Generation counters must be seen by every worker process, so pages are
+cached only when a shared cache (memcached, database, ...) is configured as
+the "changelist" alias in CACHES. Without it changelists are rendered as
+usual.
+"""
+import hashlib
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.conf.urls import patterns, url
+from django.contrib.messages import get_messages
+from django.core.cache import get_cache
+from django.core.exceptions import PermissionDenied
+from django.db.models.signals import post_save, post_delete
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.encoding import force_text
+
+from .signals import rows_changed
+
+#: shared cache alias, pages are not cached unless it is configured
+CACHE_ALIAS = 'changelist'
+CSRF_PLACEHOLDER = '__changelist_cache_csrf_token__'
+
+#: per process hit/miss counters by model label
+stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+def get_changelist_cache():
+    """
+    Returns None if no shared cache is configured
+    """
+    if CACHE_ALIAS in settings.CACHES:
+        return get_cache(CACHE_ALIAS)
+    return None
+
+
+def model_label(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.object_name.lower())
+
+
+def generation_key(model):
+    return 'examples:changelist:generation:%s' % model_label(model)
+
+
+def bump_generation(sender, **kwargs):
+    cache = get_changelist_cache()
+    if cache is None:
+        return
+    try:
+        cache.incr(generation_key(sender))
+    except ValueError:
+        cache.set(generation_key(sender), 1, None)
+
+
+class CachedChangeListMixin(object):
+    #: models whose changes also invalidate cached pages
+    cache_related_models = ()
+    #: seconds a cached page is kept
+    changelist_cache_timeout = 15 * 60
+
+    def __init__(self, *args, **kwargs):
+        super(CachedChangeListMixin, self).__init__(*args, **kwargs)
+        for model in self.get_cache_models():
+            uid = 'examples_changelist_cache_%s' % model_label(model)
+            post_save.connect(bump_generation, sender=model, dispatch_uid=uid)
+            post_delete.connect(bump_generation, sender=model,
+                                dispatch_uid=uid)
+            rows_changed.connect(bump_generation, sender=model,
+                                 dispatch_uid=uid)
+
+    def get_urls(self):
+        urls = super(CachedChangeListMixin, self).get_urls()
+        info = self.model._meta.app_label, self.model._meta.module_name
+        my_urls = patterns(
+            '',
+            url(r'^cache-stats/$',
+                self.admin_site.admin_view(self.cache_stats_view),
+                name='%s_%s_cache_stats' % info),
+        )
+        return my_urls + urls
+
+    def get_cache_models(self):
+        return (self.model,) + tuple(self.cache_related_models)
+
+    def get_permission_fingerprint(self, request):
+        # Add button, actions and editable fields depend on permissions
+        return (self.has_add_permission(request),
+                self.has_change_permission(request),
+                self.has_delete_permission(request))
+
+    def get_changelist_cache_key(self, request, cache):
+        keys = [generation_key(model) for model in self.get_cache_models()]
+        generations = cache.get_many(keys)
+        parts = [model_label(self.model), request.user.pk,
+                 self.get_permission_fingerprint(request),
+                 request.GET.urlencode()]
+        parts += [generations.get(key, 0) for key in keys]
+        digest = hashlib.md5(
+            force_text(parts).encode('utf-8')).hexdigest()
+        return 'examples:changelist:%s' % digest
+
+    def changelist_view(self, request, extra_context=None):
+        # Pages with pending messages or posted list_editable/actions must
+        # be rendered
+        cache = get_changelist_cache()
+        if (cache is None or request.method != 'GET' or
+                len(get_messages(request))):
+            return super(CachedChangeListMixin, self).changelist_view(
+                request, extra_context)
+        # Cached pages skip the permission check of the view
+        if not self.has_change_permission(request, None):
+            raise PermissionDenied
+
+        key = self.get_changelist_cache_key(request, cache)
+        counters = stats[model_label(self.model)]
+        content = cache.get(key)
+        if content is not None:
+            counters['hits'] += 1
+            return HttpResponse(
+                content.replace(CSRF_PLACEHOLDER, get_token(request)))
+
+        counters['misses'] += 1
+        response = super(CachedChangeListMixin, self).changelist_view(
+            request, extra_context)
+        if response.status_code == 200 and hasattr(response, 'render'):
+            response.render()
+            # Keep cached pages valid for any CSRF cookie
+            cache.set(key, force_text(response.content).replace(
+                get_token(request), CSRF_PLACEHOLDER),
+                self.changelist_cache_timeout)
+        return response
+
+    def after_reorder(self, objects):
+        # BulkReorderMixin writes with UPDATE queries, which send no signals
+        after_reorder = getattr(super(CachedChangeListMixin, self),
+                                'after_reorder', None)
+        if after_reorder:
+            after_reorder(objects)
+        bump_generation(self.model)
+
+    def cache_stats_view(self, request):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        return HttpResponse(json.dumps(stats[model_label(self.model)]),
+                            content_type='application/json')
@@ -0,0 +1,180 @@
+"""
+Cached <option> lists for ForeignKey select widgets.
+
+Select widgets of ModelChoiceFields query and render every choice for each
+form. Cached widgets keep the rendered options in the shared "changelist"
+cache, keyed on the choices query (so model and limit_choices_to), and only
+render the selected options on render. Cached options are dropped whenever
+a Country or Continent changes. Without the shared cache options are
+rendered as usual.
+
+NameIndex answers Select2 lookups from a sorted in-memory index of name
+word prefixes, so typing doesn't query the database. It is reloaded after
+ttl seconds or once the model changed, in any process if the shared cache
+is configured.
+"""
+import bisect
+import hashlib
+import re
+import threading
+import time
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.forms.models import ModelChoiceIterator
+from django.forms.util import flatatt
+from django.forms.widgets import Select
+from django.utils.encoding import force_text
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from django.utils.six.moves import xrange
+from suit.widgets import LinkedSelect
+
+from .caching import get_changelist_cache
+from .models import Country, Continent
+from .signals import rows_changed
+
+GENERATION_CACHE_KEY = 'examples:choices:generation'
+WORD_START_RE = re.compile(r'(?:^|(?<=\s))\S')
+
+
+def get_generation():
+    """
+    Returns None if no shared cache is configured
+    """
+    cache = get_changelist_cache()
+    if cache is None:
+        return None
+    generation = cache.get(GENERATION_CACHE_KEY)
+    if generation is None:
+        generation = 1
+        cache.add(GENERATION_CACHE_KEY, generation, None)
+    return generation
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+@receiver(post_save, sender=Continent)
+@receiver(post_delete, sender=Continent)
+@receiver(rows_changed, sender=Country)
+@receiver(rows_changed, sender=Continent)
+def invalidate_choices(sender, **kwargs):
+    cache = get_changelist_cache()
+    if cache is None:
+        return
+    try:
+        cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(GENERATION_CACHE_KEY, 1, None)
+
+
+class NameIndex(object):
+    """
+    Lowercased names of a model sorted by every word start, so rows with a
+    word starting with a term are found by bisection
+    """
+    #: seconds before the index is reloaded from the table
+    ttl = 5 * 60
+
+    def __init__(self, model, field_name='name'):
+        self.model = model
+        self.field_name = field_name
+        self.keys = self.entries = None
+        self.loaded = 0
+        self.generation = None
+        self.lock = threading.Lock()
+        uid = 'examples_name_index_%s_%s_%s' % (
+            model._meta.app_label, model._meta.object_name, field_name)
+        post_save.connect(self.invalidate, sender=model, dispatch_uid=uid,
+                          weak=False)
+        post_delete.connect(self.invalidate, sender=model, dispatch_uid=uid,
+                            weak=False)
+        rows_changed.connect(self.invalidate, sender=model, dispatch_uid=uid,
+                             weak=False)
+
+    def invalidate(self, **kwargs):
+        self.loaded = 0
+
+    def load(self):
+        rows = self.model._default_manager.order_by(
+            self.field_name, 'pk').values_list('pk', self.field_name)
+        entries = []
+        for position, (pk, name) in enumerate(rows):
+            lowered = force_text(name).lower()
+            for match in WORD_START_RE.finditer(lowered):
+                entries.append((lowered[match.start():], position, pk, name))
+        entries.sort()
+        return [entry[0] for entry in entries], entries
+
+    def get_entries(self):
+        generation = get_generation()
+        with self.lock:
+            if (self.entries is None or generation != self.generation or
+                    time.time() - self.loaded > self.ttl):
+                self.keys, self.entries = self.load()
+                self.generation, self.loaded = generation, time.time()
+            return self.keys, self.entries
+
+    def search(self, term, offset, limit):
+        """
+        Returns (has_more, [(pk, name)]) of rows with a word starting with
+        term, in name order
+        """
+        term = force_text(term).strip().lower()
+        keys, entries = self.get_entries()
+        matches = {}
+        for i in xrange(bisect.bisect_left(keys, term), len(keys)):
+            if not keys[i].startswith(term):
+                break
+            key, position, pk, name = entries[i]
+            matches[position] = (pk, name)
+        rows = [matches[position] for position in sorted(matches)]
+        return len(rows) > offset + limit, rows[offset:offset + limit]
+
+
+class CachedChoicesMixin(object):
+    """
+    Use before Select or its subclasses in bases
+    """
+
+    def get_cache_key(self, generation):
+        field = self.choices.field
+        query = '%s:%s' % (force_text(self.choices.queryset.query),
+                           field.empty_label)
+        return 'examples:choices:%s:%s' % (
+            generation, hashlib.md5(query.encode('utf-8')).hexdigest())
+
+    def render_cached_options(self, cache, value):
+        key = self.get_cache_key(get_generation())
+        options = cache.get(key)
+        if options is None:
+            # (value, label, unselected <option>) of every choice
+            options = [(force_text(option_value), force_text(label),
+                        self.render_option(set(), option_value, label))
+                       for option_value, label in self.choices]
+            cache.set(key, options)
+        selected = set([force_text(value)])
+        return '\n'.join(
+            self.render_option(selected, option_value, label)
+            if option_value in selected else html
+            for option_value, label, html in options)
+
+    def render(self, name, value, attrs=None, choices=()):
+        cache = get_changelist_cache()
+        if (cache is None or choices or
+                not isinstance(self.choices, ModelChoiceIterator)):
+            return super(CachedChoicesMixin, self).render(name, value, attrs,
+                                                          choices)
+        if value is None:
+            value = ''
+        final_attrs = self.build_attrs(attrs, name=name)
+        return format_html('<select{0}>\n{1}\n</select>', flatatt(final_attrs),
+                           mark_safe(self.render_cached_options(cache, value)))
+
+
+class CachedSelect(CachedChoicesMixin, Select):
+    pass
+
+
+class CachedLinkedSelect(CachedChoicesMixin, LinkedSelect):
+    pass
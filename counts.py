@@ -0,0 +1,211 @@
+"""
+Estimated counts for large changelists.
+
+Changelists count the filtered queryset for the paginator and the whole
+table for the "N total" link on every page load. EstimatedCountMixin takes
+the table total from database statistics instead, with an exact count for
+small tables. Filtered querysets, and the ModelAdmin.queryset() total if it
+is restricted, are counted exactly, unless count_cap is set. Pages of estimated counts are open ended: every page fetches one row
+more than it shows, so page links follow the rows actually found and no row
+is out of reach when the estimate is too low.
+"""
+from django.contrib.admin.views.main import ChangeList
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, InvalidPage, Page, \
+    PageNotAnInteger, Paginator
+from django.db import connections, router, DatabaseError
+from django.db.models.sql import EmptyResultSet
+from django.contrib.admin.options import IncorrectLookupParameters
+
+#: tables with fewer estimated rows are counted exactly
+EXACT_COUNT_THRESHOLD = 10000
+#: seconds a table estimate is cached, exact counts are never cached
+TOTAL_COUNT_TIMEOUT = 60
+
+
+def estimate_count(model):
+    """
+    Row count of model table from database statistics, None if unknown
+    """
+    using = router.db_for_read(model)
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples FROM pg_class WHERE oid = %s::regclass'
+        params = [connection.ops.quote_name(table)]
+    elif connection.vendor == 'mysql':
+        sql = ('SELECT table_rows FROM information_schema.tables '
+               'WHERE table_schema = DATABASE() AND table_name = %s')
+        params = [table]
+    elif connection.vendor == 'sqlite':
+        # Filled by ANALYZE, first number of stat is the table row count
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+        params = [table]
+    else:
+        return None
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None:
+        return None
+    return int(float(str(row[0]).split()[0]))
+
+
+def get_total_count(model):
+    """
+    Returns (count, estimated) tuple for the whole model table
+    """
+    key = 'examples:total_count:%s.%s' % (model._meta.app_label,
+                                          model._meta.object_name.lower())
+    count = cache.get(key)
+    if count is None:
+        # -1 caches unknown statistics
+        count = estimate_count(model)
+        count = -1 if count is None else count
+        cache.set(key, count, TOTAL_COUNT_TIMEOUT)
+    if count < EXACT_COUNT_THRESHOLD:
+        return model._default_manager.count(), False
+    return count, True
+
+
+def is_whole_table(queryset):
+    query = queryset.query
+    return not query.where and not query.distinct
+
+
+def get_where(queryset):
+    """
+    Returns (sql, params, distinct) restricting queryset rows, None if no
+    row matches
+    """
+    query = queryset.query
+    compiler = query.get_compiler(queryset.db)
+    try:
+        sql, params = query.where.as_sql(compiler.quote_name_unless_alias,
+                                         compiler.connection)
+    except EmptyResultSet:
+        return None
+    return sql, list(params), query.distinct
+
+
+def is_unfiltered(queryset, root_queryset):
+    """
+    Whether queryset has the rows of root_queryset, the ModelAdmin.queryset()
+    the changelist filters
+    """
+    where = get_where(queryset)
+    return where is not None and where == get_where(root_queryset)
+
+
+class EstimatedCountPaginator(Paginator):
+    #: filtered querysets are counted up to count_cap rows, None counts all
+    count_cap = None
+
+    def __init__(self, *args, **kwargs):
+        super(EstimatedCountPaginator, self).__init__(*args, **kwargs)
+        self.estimated = False
+
+    def _get_count(self):
+        if self._count is None:
+            if is_whole_table(self.object_list):
+                self._count, self.estimated = get_total_count(
+                    self.object_list.model)
+            elif self.count_cap is None:
+                self._count = self.object_list.count()
+            else:
+                self._count = self.object_list.order_by()[
+                    :self.count_cap].count()
+                self.estimated = self._count >= self.count_cap
+        return self._count
+    count = property(_get_count)
+
+    def validate_number(self, number):
+        if not self.count or not self.estimated:
+            return super(EstimatedCountPaginator, self).validate_number(
+                number)
+        # Pages past an estimate may have rows, page() checks them
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        if not self.count or not self.estimated:
+            return super(EstimatedCountPaginator, self).page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        if len(rows) > self.per_page:
+            # At least one more page, whatever the estimate says
+            self._count = max(self.count, bottom + len(rows))
+            self._num_pages = max(self.num_pages, number + 1)
+        else:
+            self._count = bottom + len(rows)
+            self._num_pages = number
+            self.estimated = False
+        return Page(rows[:self.per_page], number, self)
+
+
+class EstimatedCountChangeList(ChangeList):
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.query_set,
+                                                   self.list_per_page)
+        result_count = paginator.count
+        # Table total comes from statistics, never a second COUNT
+        unfiltered = is_unfiltered(self.query_set, self.root_query_set)
+        if unfiltered:
+            full_result_count = result_count
+            full_count_estimated = paginator.estimated
+        elif is_whole_table(self.root_query_set):
+            full_result_count, full_count_estimated = get_total_count(
+                self.model)
+        else:
+            full_result_count = self.root_query_set.count()
+            full_count_estimated = False
+
+        can_show_all = (result_count <= self.list_max_show_all and
+                        not paginator.estimated)
+        multi_page = result_count > self.list_per_page
+
+        if (self.show_all and can_show_all) or not multi_page:
+            result_list = self.query_set._clone()
+        else:
+            try:
+                result_list = paginator.page(self.page_num + 1).object_list
+            except InvalidPage:
+                raise IncorrectLookupParameters
+            # Estimated counts are corrected by the rows found
+            result_count = paginator.count
+            if unfiltered:
+                full_result_count = result_count
+                full_count_estimated = paginator.estimated
+
+        self.result_count = result_count
+        self.full_result_count = full_result_count
+        self.result_list = result_list
+        self.can_show_all = can_show_all
+        self.multi_page = multi_page
+        self.paginator = paginator
+        #: shown next to the counts by admin/examples/change_list.html
+        self.count_estimated = paginator.estimated or full_count_estimated
+
+
+class EstimatedCountMixin(object):
+    paginator = EstimatedCountPaginator
+
+    def get_changelist(self, request, **kwargs):
+        ChangeListClass = super(EstimatedCountMixin, self).get_changelist(
+            request, **kwargs)
+        if issubclass(ChangeListClass, EstimatedCountChangeList):
+            return ChangeListClass
+        return type('EstimatedCountChangeList',
+                    (EstimatedCountChangeList, ChangeListClass), {})
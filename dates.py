@@ -0,0 +1,161 @@
+"""
+Cached date histogram for admin date_hierarchy.
+
+date_hierarchy runs MIN/MAX and DISTINCT date queries over the changelist
+queryset on every page load. DateHistogram keeps row counts per day, month
+and year of a date field in the cache and adjusts them with cache.incr() on
+save and delete, so the unfiltered drill-down is served without touching
+the table. See the cached_date_hierarchy template tag.
+
+Every count has its own key, so concurrent saves don't overwrite each other.
+Counts are namespaced by a version stored with the year range; dropping it
+makes the next read rebuild all counts from the table.
+"""
+import datetime
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.signals import post_init, post_save, post_delete
+
+from .signals import rows_changed
+
+
+class DateHistogram(object):
+    #: seconds before the histogram is rebuilt from the table
+    timeout = 60 * 60
+
+    def __init__(self, model, field_name):
+        self.model = model
+        self.field_name = field_name
+        self.attname = model._meta.get_field(field_name).attname
+        self.old_value_attr = '_histogram_old_%s' % field_name
+        uid = 'examples_date_histogram_%s_%s_%s' % (
+            model._meta.app_label, model._meta.object_name, field_name)
+        post_init.connect(self.on_post_init, sender=model, dispatch_uid=uid,
+                          weak=False)
+        post_save.connect(self.on_post_save, sender=model, dispatch_uid=uid,
+                          weak=False)
+        post_delete.connect(self.on_post_delete, sender=model,
+                            dispatch_uid=uid, weak=False)
+        rows_changed.connect(self.invalidate, sender=model, dispatch_uid=uid,
+                             weak=False)
+
+    @property
+    def cache_key(self):
+        return 'examples:date_histogram:%s.%s:%s' % (
+            self.model._meta.app_label, self.model._meta.object_name.lower(),
+            self.field_name)
+
+    def bucket_key(self, version, *parts):
+        return '%s:%s:%s' % (self.cache_key, version,
+                             '-'.join('%02d' % part for part in parts))
+
+    def get_state(self):
+        """
+        Returns {'version': .., 'years': (first, last) or None}, building
+        the counts from the table if they are not cached
+        """
+        state = cache.get(self.cache_key)
+        if state is None:
+            state = self.build()
+        return state
+
+    def build(self):
+        rows = self.model._default_manager.filter(**{
+            '%s__isnull' % self.field_name: False
+        }).values_list(self.field_name).annotate(
+            count=Count('pk')).order_by()
+        version = uuid.uuid4().hex
+        counts = defaultdict(int)
+        for day, count in rows:
+            for parts in ((day.year,), (day.year, day.month),
+                          (day.year, day.month, day.day)):
+                counts[self.bucket_key(version, *parts)] += count
+        years = [day.year for day, count in rows]
+        state = {'version': version,
+                 'years': (min(years), max(years)) if years else None}
+        cache.set_many(counts, self.timeout)
+        # Backends without native incr() reset the timeout of incremented
+        # keys to the default one, so counts must outlive the state
+        cache.set(self.cache_key, state,
+                  min(self.timeout, cache.default_timeout))
+        return state
+
+    def adjust(self, day, delta):
+        if day is None:
+            return
+        state = cache.get(self.cache_key)
+        if state is None:
+            # Not built yet, will be built from the table when needed
+            return
+        years = state['years']
+        if delta > 0 and (years is None or
+                          not years[0] <= day.year <= years[1]):
+            # Year range can't be changed atomically, rebuild instead
+            cache.delete(self.cache_key)
+            return
+        for parts in ((day.year,), (day.year, day.month),
+                      (day.year, day.month, day.day)):
+            key = self.bucket_key(state['version'], *parts)
+            try:
+                cache.incr(key, delta)
+            except ValueError:
+                if delta > 0 and not cache.add(key, delta, self.timeout):
+                    cache.incr(key, delta)
+
+    def invalidate(self, **kwargs):
+        cache.delete(self.cache_key)
+
+    def on_post_init(self, sender, instance, **kwargs):
+        # Deferred values are not loaded, their old value stays unknown
+        if self.attname in instance.__dict__:
+            setattr(instance, self.old_value_attr,
+                    instance.__dict__[self.attname])
+
+    def on_post_save(self, sender, instance, created, raw=False, **kwargs):
+        new = getattr(instance, self.field_name)
+        if created:
+            self.adjust(new, 1)
+        elif not hasattr(instance, self.old_value_attr):
+            cache.delete(self.cache_key)
+        else:
+            old = getattr(instance, self.old_value_attr)
+            if old != new:
+                self.adjust(old, -1)
+                self.adjust(new, 1)
+        setattr(instance, self.old_value_attr, new)
+
+    def on_post_delete(self, sender, instance, **kwargs):
+        self.adjust(getattr(instance, self.field_name), -1)
+
+    def get_counts(self, version, buckets):
+        keys = [self.bucket_key(version, *parts) for parts in buckets]
+        counts = cache.get_many(keys)
+        return [parts for parts, key in zip(buckets, keys)
+                if counts.get(key, 0) > 0]
+
+    def years(self):
+        state = self.get_state()
+        if state['years'] is None:
+            return []
+        first, last = state['years']
+        return [year for year, in self.get_counts(
+            state['version'], [(year,) for year in range(first, last + 1)])]
+
+    def months(self, year):
+        state = self.get_state()
+        return [datetime.date(year, month, 1) for year, month in
+                self.get_counts(state['version'], [
+                    (year, month) for month in range(1, 13)])]
+
+    def days(self, year, month):
+        state = self.get_state()
+        buckets = []
+        day = datetime.date(year, month, 1)
+        while day.month == month:
+            buckets.append((year, month, day.day))
+            day += datetime.timedelta(days=1)
+        return [datetime.date(*parts)
+                for parts in self.get_counts(state['version'], buckets)]
@@ -0,0 +1,174 @@
+"""
+Bulk save for list_editable changelists.
+
+Django saves every changed changelist row with a full save(), writing all
+columns and firing all signals, and MPTT models may move nodes on every
+save. BulkListEditableMixin writes changes of bulk_editable fields with one
+UPDATE ... WHERE id IN (...) per field and value instead, and logs them
+with a single LogEntry insert. Rows that change other fields are still
+saved one by one as usual. Posted primary keys are resolved against the
+rows of the changelist page, not with a query per row.
+"""
+from django.contrib.admin.models import LogEntry, CHANGE
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.contenttypes.models import ContentType
+from django.core.validators import EMPTY_VALUES
+from django.db import transaction
+from django.forms.models import ModelChoiceField
+from django.forms.widgets import HiddenInput
+from django.http import HttpResponseRedirect
+from django.utils import timezone
+from django.utils.encoding import force_text
+from django.utils.translation import ungettext
+
+from .sortables import BULK_UPDATE_BATCH_SIZE
+
+
+class LoadedObjectChoiceField(ModelChoiceField):
+    """
+    Primary key field of formset forms, finds posted keys in {pk: object}
+    of loaded rows and queries only the ones not found
+    """
+
+    def __init__(self, objects, *args, **kwargs):
+        super(LoadedObjectChoiceField, self).__init__(*args, **kwargs)
+        self.objects = objects
+
+    def to_python(self, value):
+        if value in EMPTY_VALUES:
+            return None
+        try:
+            return self.objects[force_text(value)]
+        except KeyError:
+            return super(LoadedObjectChoiceField, self).to_python(value)
+
+
+class LoadedObjectsFormSetMixin(object):
+    def get_loaded_objects(self):
+        if not hasattr(self, '_loaded_objects'):
+            # Iterates the queryset the formset reads its rows from
+            self._loaded_objects = dict(
+                (force_text(obj.pk), obj) for obj in self.get_queryset())
+        return self._loaded_objects
+
+    def add_fields(self, form, index):
+        super(LoadedObjectsFormSetMixin, self).add_fields(form, index)
+        name = self.model._meta.pk.name
+        field = form.fields.get(name)
+        if type(field) is ModelChoiceField:
+            form.fields[name] = LoadedObjectChoiceField(
+                self.get_loaded_objects(), field.queryset,
+                initial=field.initial, required=False, widget=HiddenInput)
+
+
+class BulkListEditableMixin(object):
+    """
+    Bulk written fields skip save() and model signals, so don't list fields
+    which other fields or caches depend on
+    """
+    #: list_editable fields written in bulk, defaults to all of them
+    bulk_editable = None
+
+    def get_bulk_editable(self, request):
+        if self.bulk_editable is None:
+            return list(self.list_editable)
+        return list(self.bulk_editable)
+
+    def get_changelist_formset(self, request, **kwargs):
+        FormSet = super(BulkListEditableMixin, self).get_changelist_formset(
+            request, **kwargs)
+        return type(FormSet.__name__, (LoadedObjectsFormSetMixin, FormSet),
+                    {})
+
+    def get_changelist_instance(self, request):
+        # Same arguments as changelist_view() passes
+        list_display = self.get_list_display(request)
+        list_display_links = self.get_list_display_links(request,
+                                                         list_display)
+        if self.get_actions(request):
+            list_display = ['action_checkbox'] + list(list_display)
+        ChangeList = self.get_changelist(request)
+        return ChangeList(request, self.model, list_display,
+                          list_display_links, self.get_list_filter(request),
+                          self.date_hierarchy, self.search_fields,
+                          self.list_select_related, self.list_per_page,
+                          self.list_max_show_all, self.list_editable, self)
+
+    def changelist_view(self, request, extra_context=None):
+        if (request.method == 'POST' and self.list_editable and
+                '_save' in request.POST and
+                self.has_change_permission(request, None)):
+            response = self.bulk_edit(request)
+            if response is not None:
+                return response
+        # Invalid forms are rendered by the regular view
+        return super(BulkListEditableMixin, self).changelist_view(
+            request, extra_context)
+
+    def bulk_edit(self, request):
+        try:
+            cl = self.get_changelist_instance(request)
+        except IncorrectLookupParameters:
+            return None
+        FormSet = self.get_changelist_formset(request)
+        formset = FormSet(request.POST, request.FILES,
+                          queryset=cl.result_list)
+        if not formset.is_valid():
+            return None
+
+        bulk_editable = set(self.get_bulk_editable(request))
+        updates, logged = {}, []
+        with transaction.commit_on_success():
+            for form in formset.forms:
+                if not form.has_changed():
+                    continue
+                if set(form.changed_data) <= bulk_editable:
+                    # Assigns cleaned values, so log shows the new repr
+                    obj = self.save_form(request, form, change=True)
+                    for name in form.changed_data:
+                        updates.setdefault(
+                            (name, form.cleaned_data[name]), []).append(obj.pk)
+                else:
+                    obj = self.save_form(request, form, change=True)
+                    self.save_model(request, obj, form, change=True)
+                    self.save_related(request, form, formsets=[],
+                                      change=True)
+                logged.append((obj, self.construct_change_message(
+                    request, form, None)))
+
+            for (name, value), pks in updates.items():
+                for start in range(0, len(pks), BULK_UPDATE_BATCH_SIZE):
+                    self.model._default_manager.filter(
+                        pk__in=pks[start:start + BULK_UPDATE_BATCH_SIZE]
+                    ).update(**{name: value})
+            self.log_changes(request, logged)
+
+        if logged:
+            opts = self.model._meta
+            if len(logged) == 1:
+                name = force_text(opts.verbose_name)
+            else:
+                name = force_text(opts.verbose_name_plural)
+            msg = ungettext("%(count)s %(name)s was changed successfully.",
+                            "%(count)s %(name)s were changed successfully.",
+                            len(logged)) % {'count': len(logged),
+                                            'name': name}
+            self.message_user(request, msg)
+        return HttpResponseRedirect(request.get_full_path())
+
+    def log_changes(self, request, logged):
+        """
+        Same entries as log_change() of every (object, message), written
+        with one query
+        """
+        content_type_id = ContentType.objects.get_for_model(self.model).pk
+        now = timezone.now()
+        LogEntry.objects.bulk_create([LogEntry(
+            action_time=now,
+            user_id=request.user.pk,
+            content_type_id=content_type_id,
+            object_id=force_text(obj.pk),
+            object_repr=force_text(obj)[:200],
+            action_flag=CHANGE,
+            change_message=message,
+        ) for obj, message in logged])
@@ -0,0 +1,118 @@
+"""
+Streaming export for ImportExportModelAdmin based admins.
+
+Stock import-export builds the whole tablib dataset in memory before
+returning it. StreamingExportMixin walks the export queryset in primary key
+ordered chunks and writes rows to the response as they are read, so memory
+use stays flat regardless of the number of exported rows.
+"""
+import csv
+import json
+from datetime import datetime
+
+from django.conf.urls import patterns, url
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import six
+from django.utils.encoding import force_text
+
+
+def iterate_values(queryset, fields, chunk_size=2000):
+    """
+    Yield values_list() rows of queryset in chunks of chunk_size.
+    Pages by primary key instead of OFFSET, so every chunk is an index range
+    scan and only one chunk is held in memory at a time.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk = queryset
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        rows = list(chunk.values_list('pk', *fields)[:chunk_size])
+        if not rows:
+            return
+        for row in rows:
+            yield row[1:]
+        last_pk = rows[-1][0]
+
+
+class Echo(object):
+    """
+    File-like object that returns written value instead of buffering it
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_rows(fields, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        values = [force_text(v) if v is not None else '' for v in row]
+        if six.PY2:
+            values = [v.encode('utf-8') for v in values]
+        yield writer.writerow(values)
+
+
+def jsonl_rows(fields, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+#: streaming export formats: name -> (row serializer, content type)
+STREAMING_FORMATS = {
+    'csv': (csv_rows, 'text/csv'),
+    'jsonl': (jsonl_rows, 'application/x-ndjson'),
+}
+
+
+class StreamingExportMixin(object):
+    """
+    Adds export/stream/?format=csv|jsonl view to ImportExportModelAdmin.
+    Respects the changelist search and filters like the regular export.
+    """
+    #: exported model fields, defaults to all concrete fields
+    export_stream_fields = None
+    #: number of rows fetched per query
+    export_chunk_size = 2000
+
+    def get_urls(self):
+        urls = super(StreamingExportMixin, self).get_urls()
+        info = self.model._meta.app_label, self.model._meta.module_name
+        my_urls = patterns(
+            '',
+            url(r'^export/stream/$',
+                self.admin_site.admin_view(self.export_stream_action),
+                name='%s_%s_export_stream' % info),
+        )
+        return my_urls + urls
+
+    def get_export_stream_fields(self):
+        if self.export_stream_fields:
+            return list(self.export_stream_fields)
+        return [f.attname for f in self.model._meta.fields]
+
+    def export_stream_action(self, request, *args, **kwargs):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        file_format = request.GET.get('format', 'csv')
+        if file_format not in STREAMING_FORMATS:
+            file_format = 'csv'
+        serializer, content_type = STREAMING_FORMATS[file_format]
+
+        # Drop our own parameter before the changelist sees it as a filter
+        request.GET = request.GET.copy()
+        request.GET.pop('format', None)
+
+        fields = self.get_export_stream_fields()
+        rows = iterate_values(self.get_export_queryset(request), fields,
+                              self.export_chunk_size)
+        response = StreamingHttpResponse(serializer(fields, rows),
+                                         content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename=%s-%s.%s' % (
+            self.model.__name__, datetime.now().strftime('%Y-%m-%d'),
+            file_format)
+        return response
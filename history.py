@@ -0,0 +1,59 @@
+"""
+Paginated history view for django-reversion VersionAdmin.
+
+Stock VersionAdmin lists every version of an object on the history page.
+PaginatedHistoryMixin pages through them by version id (keyset pagination),
+so every page is one indexed range query regardless of how many versions
+exist. Version data is not loaded for the list, it is only deserialized when
+a single version is opened.
+"""
+from django.contrib.admin.util import unquote, quote
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import reverse
+from reversion.admin import VersionAdmin
+
+
+class PaginatedHistoryMixin(object):
+    """
+    Must be placed before VersionAdmin in bases
+    """
+    history_per_page = 50
+    object_history_template = 'reversion/examples/object_history.html'
+
+    def history_view(self, request, object_id, extra_context=None):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        object_id = unquote(object_id)
+        opts = self.model._meta
+
+        versions = self._order_version_queryset(
+            self.revision_manager.get_for_object_reference(
+                self.model, object_id)
+        ).select_related('revision__user').defer('serialized_data')
+        after = request.GET.get('after', '')
+        if after.isdigit():
+            lookup = 'pk__lt' if self.history_latest_first else 'pk__gt'
+            versions = versions.filter(**{lookup: after})
+
+        versions = list(versions[:self.history_per_page + 1])
+        next_after = None
+        if len(versions) > self.history_per_page:
+            versions = versions[:self.history_per_page]
+            next_after = versions[-1].pk
+
+        action_list = [
+            {
+                'revision': version.revision,
+                'url': reverse('%s:%s_%s_revision' % (
+                    self.admin_site.name, opts.app_label, opts.module_name),
+                    args=(quote(version.object_id), version.id)),
+            }
+            for version in versions
+        ]
+        context = {'action_list': action_list,
+                   'next_after': next_after,
+                   'is_first_page': not after}
+        context.update(extra_context or {})
+        # Skip VersionAdmin.history_view, which lists all versions
+        return super(VersionAdmin, self).history_view(request, object_id,
+                                                      context)
@@ -0,0 +1,197 @@
+"""
+Bulk import for ImportExportModelAdmin based admins.
+
+Stock import-export loads, saves and diffs every row on its own, so an
+import costs several queries per row. BulkModelResource processes rows in
+batches instead: existing objects are looked up by id, or by a natural key
+for rows without one, with one query per batch, new rows are inserted with
+bulk_create() and changed rows are written with one UPDATE per distinct set
+of values. Only a sample of row diffs is rendered on the confirmation page.
+
+With use_transactions the whole import runs in one transaction and nothing
+is written if any row fails. Otherwise every batch is committed on its own,
+so batches before a failing one stay imported.
+"""
+import sys
+import traceback
+from collections import OrderedDict
+
+from django.db import transaction
+from import_export import widgets
+from import_export.resources import ModelResource
+from import_export.results import Error, Result, RowResult
+
+
+class BulkModelResource(ModelResource):
+    #: field used to match imported rows with existing objects
+    natural_key = 'name'
+    #: number of rows validated and written at a time, natural keys of a
+    #: batch are query parameters, SQLite allows 999 of them
+    batch_size = 500
+    #: number of row diffs kept for the confirmation page
+    diff_sample_size = 20
+    #: optional progress(done, total) callback, called after every batch
+    progress = None
+
+    def get_import_fields(self):
+        return [f for f in self.get_fields()
+                if f.attribute and not f.readonly and f.attribute != 'id'
+                and not isinstance(f.widget, widgets.ManyToManyWidget)]
+
+    def import_data(self, dataset, dry_run=False, raise_errors=False,
+                    use_transactions=None):
+        """
+        Invalid rows are reported in result.base_errors instead of raised.
+        raise_errors only re-raises unexpected exceptions
+        """
+        if use_transactions is None:
+            use_transactions = self.get_use_transactions()
+        if use_transactions:
+            # Whole import in one transaction, rolled back on errors
+            transaction.enter_transaction_management()
+            transaction.managed(True)
+        try:
+            result = self.import_batches(dataset, dry_run, raise_errors,
+                                         use_transactions)
+        except Exception:
+            if use_transactions:
+                transaction.rollback()
+                transaction.leave_transaction_management()
+            raise
+        if use_transactions:
+            if dry_run or result.has_errors():
+                transaction.rollback()
+            else:
+                transaction.commit()
+            transaction.leave_transaction_management()
+        return result
+
+    def import_batches(self, dataset, dry_run, raise_errors,
+                       use_transactions):
+        result = Result()
+        result.totals = dict.fromkeys((RowResult.IMPORT_TYPE_NEW,
+                                       RowResult.IMPORT_TYPE_UPDATE), 0)
+        rows = dataset.dict
+        for start in range(0, len(rows), self.batch_size):
+            try:
+                self.import_batch(rows[start:start + self.batch_size],
+                                  start, result, dry_run, use_transactions)
+            except Exception as e:
+                tb_info = traceback.format_exc(sys.exc_info()[2])
+                result.base_errors.append(Error(repr(e), tb_info))
+                if raise_errors:
+                    raise
+            if result.base_errors and not dry_run:
+                break
+            if self.progress:
+                self.progress(min(start + self.batch_size, len(rows)),
+                              len(rows))
+        return result
+
+    def get_row_id(self, row):
+        """
+        Returns primary key value of the row's id column, if it has one
+        """
+        value = row.get('id')
+        if value in (None, ''):
+            return None
+        return self._meta.model._meta.pk.to_python(value)
+
+    def import_batch(self, rows, offset, result, dry_run, use_transactions):
+        model = self._meta.model
+        fields = self.get_import_fields()
+
+        # Validate the batch without touching the database. Later rows for
+        # the same object win, as they would with row by row saves
+        instances = OrderedDict()
+        for line, row in enumerate(rows, offset + 1):
+            instance = model()
+            try:
+                pk = self.get_row_id(row)
+                for field in fields:
+                    self.import_field(field, instance, row)
+                instance.clean_fields()
+            except Exception as e:
+                tb_info = traceback.format_exc(sys.exc_info()[2])
+                result.base_errors.append(
+                    Error('Line %s: %r' % (line, e), tb_info))
+                continue
+            if pk is not None:
+                instances[('pk', pk)] = instance
+            else:
+                instances[('key', getattr(instance, self.natural_key))] = \
+                    instance
+        if result.base_errors:
+            return
+
+        # Rows with an id update that row or, like stock imports, create
+        # one with that id. Rows without id are matched by natural key
+        pks = set(model.objects.filter(pk__in=[
+            value for kind, value in instances if kind == 'pk'
+        ]).values_list('pk', flat=True))
+        new, updates = [], {}
+        matched, by_key = [], {}
+        for (kind, value), instance in instances.items():
+            if kind == 'key':
+                by_key[value] = instance
+                continue
+            instance.pk = value
+            if value in pks:
+                # Rows matched by id may change the natural key too
+                matched.append(instance)
+                self.add_update(updates, instance,
+                                [f.attribute for f in fields])
+            else:
+                new.append(instance)
+        existing = dict(model.objects.filter(**{
+            '%s__in' % self.natural_key: list(by_key)
+        }).values_list(self.natural_key, 'pk'))
+        for key, instance in by_key.items():
+            if key in existing:
+                instance.pk = existing[key]
+                matched.append(instance)
+                self.add_update(updates, instance, [
+                    f.attribute for f in fields
+                    if f.attribute != self.natural_key])
+            else:
+                new.append(instance)
+        result.totals[RowResult.IMPORT_TYPE_NEW] += len(new)
+        result.totals[RowResult.IMPORT_TYPE_UPDATE] += len(matched)
+        self.add_diff_sample(result, new, matched)
+
+        if dry_run:
+            return
+        if use_transactions:
+            self.write_batch(model, new, updates)
+        else:
+            with transaction.commit_on_success():
+                self.write_batch(model, new, updates)
+
+    def add_update(self, updates, instance, attributes):
+        values = tuple((attribute, getattr(instance, attribute))
+                       for attribute in attributes)
+        updates.setdefault(values, []).append(instance.pk)
+
+    def write_batch(self, model, new, updates):
+        model.objects.bulk_create(new)
+        for values, pks in updates.items():
+            model.objects.filter(pk__in=pks).update(**dict(values))
+
+    def add_diff_sample(self, result, new, matched):
+        rows = [(RowResult.IMPORT_TYPE_NEW, instance) for instance in new]
+        rows += [(RowResult.IMPORT_TYPE_UPDATE, instance)
+                 for instance in matched]
+        sample = rows[:self.diff_sample_size - len(result.rows)]
+        if not sample:
+            return
+        originals = self._meta.model.objects.in_bulk(
+            [instance.pk for import_type, instance in sample
+             if import_type == RowResult.IMPORT_TYPE_UPDATE])
+        for import_type, instance in sample:
+            row_result = RowResult()
+            row_result.import_type = import_type
+            original = None
+            if import_type == RowResult.IMPORT_TYPE_UPDATE:
+                original = originals.get(instance.pk)
+            row_result.diff = self.get_diff(original, instance)
+            result.rows.append(row_result)
@@ -0,0 +1,127 @@
+"""
+Paginated inline formsets.
+
+Inlines render a form for every related row, which makes the change form
+of objects with thousands of related rows huge and slow to save.
+PaginatedInlineMixin shows inline_per_page rows at a time, optionally
+filtered by a search term, and only forms of the shown page are bound and
+validated on save. Page and search term are read from <prefix>-page and
+<prefix>-q GET parameters, which are kept when the form is posted.
+"""
+import operator
+from functools import reduce
+
+from django.core.paginator import Paginator, InvalidPage
+from django.db.models import Max, Q
+
+
+class PaginatedFormSetMixin(object):
+    per_page = 50
+    search_fields = ()
+    query_params = None
+    anchor = ''
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            qs = super(PaginatedFormSetMixin, self).get_queryset()
+            term = self.query_params.get(self.param('q'), '').strip()
+            if term and self.search_fields:
+                qs = qs.filter(reduce(operator.or_, [
+                    Q(**{'%s__icontains' % field: term})
+                    for field in self.search_fields]))
+            self.paginator = Paginator(qs, self.per_page)
+            try:
+                self.page = self.paginator.page(
+                    self.query_params.get(self.param('page'), 1))
+            except InvalidPage:
+                self.page = self.paginator.page(1)
+            # Sliced queryset, formsets need its db
+            self._queryset = self.page.object_list
+        return self._queryset
+
+    def clean(self):
+        super(PaginatedFormSetMixin, self).clean()
+        # Sortables number shown rows from zero. Give shown rows the values
+        # they had before, so rows of other pages or not matching the search
+        # keep their places and unmoved rows stay unchanged. New rows go last
+        sortable = getattr(self, 'sortable', None)
+        if not sortable:
+            return
+        values = sorted(form.initial[sortable] for form in self.initial_forms
+                        if form.initial.get(sortable) is not None)
+        top = None
+        for form in self.forms:
+            position = getattr(form, 'cleaned_data', {}).get(sortable)
+            if position is None:
+                continue
+            if position < len(values):
+                form.cleaned_data[sortable] = values[position]
+                if values[position] == form.initial.get(sortable):
+                    # Saving skips unmoved rows
+                    form.unchanged_fields = (sortable,)
+                continue
+            if top is None:
+                # All related rows, not just the shown page
+                top = self.queryset.aggregate(top=Max(sortable))['top']
+                if top is None:
+                    top = -1
+            form.cleaned_data[sortable] = top + position - len(values) + 1
+
+    def param(self, name):
+        return '%s-%s' % (self.prefix, name)
+
+    def page_url(self, number):
+        params = self.query_params.copy()
+        params[self.param('page')] = number
+        return '?%s%s' % (params.urlencode(), self.anchor)
+
+    def previous_page_url(self):
+        if self.page.has_previous():
+            return self.page_url(self.page.previous_page_number())
+
+    def next_page_url(self):
+        if self.page.has_next():
+            return self.page_url(self.page.next_page_number())
+
+    def search_term(self):
+        return self.query_params.get(self.param('q'), '')
+
+
+class PaginatedInlineMixin(object):
+    """
+    Use before TabularInline/StackedInline or their sortable versions
+    """
+    inline_per_page = 50
+    #: fields searched with icontains by the inline search box
+    inline_search_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super(PaginatedInlineMixin, self).__init__(*args, **kwargs)
+        self.paginated_template = self.template
+        self.template = 'admin/examples/edit_inline/paginated.html'
+
+    def get_formset(self, request, obj=None, **kwargs):
+        FormSet = super(PaginatedInlineMixin, self).get_formset(
+            request, obj, **kwargs)
+        classes = getattr(self, 'suit_classes', '').split()
+        tabs = [c[len('suit-tab-'):] for c in classes
+                if c.startswith('suit-tab-')]
+
+        class PaginatedInlineForm(FormSet.form):
+            #: fields the formset found unchanged on clean
+            unchanged_fields = ()
+
+            @property
+            def changed_data(self):
+                return [name for name in super(
+                    PaginatedInlineForm, self).changed_data
+                    if name not in self.unchanged_fields]
+
+        PaginatedInlineForm.__name__ = FormSet.form.__name__
+        return type(FormSet.__name__, (PaginatedFormSetMixin, FormSet), {
+            'form': PaginatedInlineForm,
+            'per_page': self.inline_per_page,
+            'search_fields': self.inline_search_fields,
+            'query_params': request.GET,
+            'anchor': '#%s' % tabs[0] if tabs else '',
+        })
@@ -0,0 +1,431 @@
+"""
+Background jobs for long running admin imports and exports.
+
+Jobs run on a fixed number of daemon threads of the web process, so no
+broker is needed; when JOB_QUEUE_SIZE jobs wait already, new ones are
+refused. Job state is kept in the shared "changelist" cache (see
+caching.py), so any process can answer the progress polls of the
+changelist. Without that cache imports and exports run in the request.
+Processes save the state of their jobs every JOB_HEARTBEAT seconds, jobs of
+a stopped process are reported as failed after JOB_STALE_TIMEOUT.
+
+Threads use their own database connection, which doesn't see data of
+uncommitted test transactions. Set EXAMPLES_JOBS_INLINE = True in test
+settings to run jobs in the request instead.
+
+Export files are removed once downloaded; files never downloaded are
+removed when the next export starts after JOB_TIMEOUT.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.conf.urls import patterns, url
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.core.servers.basehttp import FileWrapper
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.http import HttpResponse, HttpResponseRedirect, Http404, \
+    StreamingHttpResponse
+from django.utils import six
+from django.utils.encoding import force_text
+from django.utils.six.moves import queue
+from django.utils.translation import ugettext as _
+from import_export.forms import ConfirmImportForm
+
+from .caching import get_changelist_cache
+from .exports import csv_rows, iterate_values
+
+#: how long finished job state is kept, in seconds
+JOB_TIMEOUT = 24 * 60 * 60
+#: worker threads per process
+JOB_WORKERS = 2
+#: jobs waiting for a worker per process
+JOB_QUEUE_SIZE = 20
+#: seconds between saves of pending and running jobs
+JOB_HEARTBEAT = 30
+#: pending or running jobs not saved for this long have lost their process
+JOB_STALE_TIMEOUT = 5 * 60
+EXPORT_FILE_PREFIX = 'examples_export_'
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+
+def job_cache_key(job_id):
+    return 'examples:job:%s' % job_id
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def get_job(job_id):
+    cache = get_changelist_cache()
+    if cache is None:
+        return None
+    job = cache.get(job_cache_key(job_id))
+    if (job is not None and job['status'] in (PENDING, RUNNING) and
+            time.time() - job['updated'] > JOB_STALE_TIMEOUT):
+        job = dict(job, status=FAILED, error='Worker process stopped')
+    return job
+
+
+class Job(object):
+    """
+    State of a single job as seen by the running function. Call
+    progress(done, total) periodically; state is persisted at most once per
+    update_interval seconds
+    """
+    update_interval = 0.5
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex
+        self.state = {'id': self.id, 'name': name, 'status': PENDING,
+                      'done': 0, 'total': None, 'rows_per_second': 0,
+                      'result': None, 'error': None, 'updated': None}
+        self.started = None
+        self.saved = 0
+        self.lock = threading.Lock()
+        self.save()
+
+    def save(self):
+        # Also called by the heartbeat thread
+        with self.lock:
+            self.saved = self.state['updated'] = time.time()
+            get_changelist_cache().set(job_cache_key(self.id),
+                                       dict(self.state), JOB_TIMEOUT)
+
+    def progress(self, done, total=None):
+        self.state['done'] = done
+        if total is not None:
+            self.state['total'] = total
+        elapsed = time.time() - self.started
+        if elapsed:
+            self.state['rows_per_second'] = int(done / elapsed)
+        if time.time() - self.saved >= self.update_interval:
+            self.save()
+
+    def run(self, func, args, kwargs, close_connection=True):
+        self.started = time.time()
+        self.state['status'] = RUNNING
+        self.save()
+        try:
+            self.state['result'] = func(self, *args, **kwargs)
+            self.state['status'] = DONE
+        except Exception as e:
+            self.state['status'] = FAILED
+            self.state['error'] = repr(e)
+        finally:
+            if close_connection:
+                # Threads get their own connection, which Django won't close
+                connection.close()
+            self.progress(self.state['done'])
+            self.save()
+
+
+class JobPool(object):
+    """
+    Runs jobs on a fixed number of daemon threads, started on first use.
+    Another thread saves pending and running jobs every JOB_HEARTBEAT
+    seconds, so they don't look stale
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue = queue.Queue(queue_size)
+        self.jobs = set()
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        for target in [self.work] * self.workers + [self.beat]:
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, job, func, args, kwargs):
+        self.start()
+        with self.lock:
+            self.jobs.add(job)
+        try:
+            self.queue.put_nowait((job, func, args, kwargs))
+        except queue.Full:
+            with self.lock:
+                self.jobs.discard(job)
+            raise JobQueueFull
+
+    def work(self):
+        while True:
+            job, func, args, kwargs = self.queue.get()
+            try:
+                job.run(func, args, kwargs)
+            finally:
+                with self.lock:
+                    self.jobs.discard(job)
+
+    def beat(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT)
+            with self.lock:
+                jobs = list(self.jobs)
+            for job in jobs:
+                job.save()
+
+
+pool = JobPool(JOB_WORKERS, JOB_QUEUE_SIZE)
+
+
+def jobs_available():
+    return get_changelist_cache() is not None
+
+
+def start_job(name, func, *args, **kwargs):
+    """
+    Run func(job, *args, **kwargs) in background and return job id.
+    Return value of func is stored in job state as "result". Raises
+    JobQueueFull when too many jobs wait already
+    """
+    job = Job(name)
+    # Read on every call, so override_settings works in tests
+    if getattr(settings, 'EXAMPLES_JOBS_INLINE', False):
+        job.run(func, args, kwargs, close_connection=False)
+        return job.id
+    try:
+        pool.submit(job, func, args, kwargs)
+    except JobQueueFull:
+        job.state.update(status=FAILED, error='Too many jobs')
+        job.save()
+        raise
+    return job.id
+
+
+def import_file(resource_class, input_format, file_name, encoding,
+                progress=None):
+    """
+    Imports the confirmed file and returns the import Result
+    """
+    with open(file_name, input_format.get_read_mode()) as f:
+        data = f.read()
+    if not input_format.is_binary() and encoding:
+        data = force_text(data, encoding)
+        if six.PY2:
+            data = data.encode('utf-8')
+    dataset = input_format.create_dataset(data)
+    resource = resource_class()
+    resource.progress = progress
+    return resource.import_data(dataset, dry_run=False, raise_errors=True)
+
+
+def first_error(result):
+    errors = result.base_errors or [
+        error for line, errors in result.row_errors() for error in errors]
+    return errors[0].error
+
+
+def run_import(job, resource_class, input_format, file_name, encoding):
+    result = import_file(resource_class, input_format, file_name, encoding,
+                         job.progress)
+    if result.has_errors():
+        raise ValueError(first_error(result))
+    return getattr(result, 'totals', None)
+
+
+def remove_expired_exports():
+    """
+    Removes export files older than JOB_TIMEOUT, whose jobs are gone
+    """
+    directory = tempfile.gettempdir()
+    expires = time.time() - JOB_TIMEOUT
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if name.startswith(EXPORT_FILE_PREFIX) and \
+                    os.path.getmtime(path) < expires:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def run_export(job, queryset, fields, chunk_size):
+    remove_expired_exports()
+    job.progress(0, queryset.count())
+    with tempfile.NamedTemporaryFile(prefix=EXPORT_FILE_PREFIX,
+                                     suffix='.csv', delete=False) as f:
+        lines = csv_rows(fields, iterate_values(queryset, fields, chunk_size))
+        # Header line is not a row
+        f.write(encode_line(next(lines)))
+        done = 0
+        for done, line in enumerate(lines, 1):
+            f.write(encode_line(line))
+            if not done % chunk_size:
+                job.progress(done)
+        job.progress(done)
+    return {'file': f.name}
+
+
+def encode_line(line):
+    return line if six.PY2 else line.encode('utf-8')
+
+
+class RemovingFileWrapper(FileWrapper):
+    """
+    Removes the file once it has been sent
+    """
+    def __init__(self, filelike, *args, **kwargs):
+        FileWrapper.__init__(self, filelike, *args, **kwargs)
+        # FileWrapper sets close to filelike.close on the instance
+        self.close = self.close_and_remove
+
+    def close_and_remove(self):
+        self.filelike.close()
+        try:
+            os.remove(self.filelike.name)
+        except OSError:
+            pass
+
+
+class BackgroundJobMixin(object):
+    """
+    Runs confirmed imports and CSV exports of ImportExportModelAdmin in
+    background jobs. Started jobs are remembered in the session and their
+    progress is polled from the changelist via job/<id>/.
+    Use with StreamingExportMixin, which provides export field settings.
+    """
+    #: set to False to run imports in the request
+    background_jobs = True
+
+    def use_background_jobs(self):
+        # Job state must be seen by every process
+        return self.background_jobs and jobs_available()
+
+    def get_urls(self):
+        urls = super(BackgroundJobMixin, self).get_urls()
+        info = self.model._meta.app_label, self.model._meta.module_name
+        my_urls = patterns(
+            '',
+            url(r'^export/job/$',
+                self.admin_site.admin_view(self.export_job_action),
+                name='%s_%s_export_job' % info),
+            url(r'^job/(\w+)/$',
+                self.admin_site.admin_view(self.job_progress_view),
+                name='%s_%s_job' % info),
+            url(r'^job/(\w+)/download/$',
+                self.admin_site.admin_view(self.job_download_view),
+                name='%s_%s_job_download' % info),
+        )
+        return my_urls + urls
+
+    def get_changelist_url(self):
+        opts = self.model._meta
+        return reverse('admin:%s_%s_changelist' %
+                       (opts.app_label, opts.module_name),
+                       current_app=self.admin_site.name)
+
+    def session_jobs_key(self):
+        return 'examples_jobs_%s' % self.model._meta.module_name
+
+    def remember_job(self, request, job_id):
+        key = self.session_jobs_key()
+        request.session[key] = request.session.get(key, []) + [job_id]
+
+    def get_user_job(self, request, job_id):
+        if job_id not in request.session.get(self.session_jobs_key(), []):
+            raise Http404
+        job = get_job(job_id)
+        if job is None:
+            raise Http404
+        return job
+
+    def changelist_view(self, request, extra_context=None):
+        key = self.session_jobs_key()
+        job_ids = request.session.get(key, [])
+        jobs = [job for job in map(get_job, job_ids) if job is not None]
+        if len(jobs) != len(job_ids):
+            # Forget expired jobs, unchanged sessions are not saved
+            request.session[key] = [job['id'] for job in jobs]
+        extra_context = extra_context or {}
+        extra_context['jobs'] = jobs
+        extra_context['background_jobs'] = self.use_background_jobs()
+        return super(BackgroundJobMixin, self).changelist_view(
+            request, extra_context)
+
+    def process_import(self, request, *args, **kwargs):
+        confirm_form = ConfirmImportForm(request.POST)
+        if confirm_form.is_valid():
+            import_formats = self.get_import_formats()
+            input_format = import_formats[
+                int(confirm_form.cleaned_data['input_format'])
+            ]()
+            import_args = (self.get_resource_class(), input_format,
+                           confirm_form.cleaned_data['import_file_name'],
+                           self.from_encoding)
+            if not self.use_background_jobs():
+                # Failed rows are reported instead of raised
+                result = import_file(*import_args)
+                if result.has_errors():
+                    messages.error(request, _('Import failed: %s') %
+                                   first_error(result))
+                else:
+                    messages.success(request, _('Import finished'))
+                return HttpResponseRedirect(self.get_changelist_url())
+            try:
+                job_id = start_job('import', run_import, *import_args)
+            except JobQueueFull:
+                messages.error(request, _('Too many jobs, try again later'))
+            else:
+                self.remember_job(request, job_id)
+                messages.info(request, _('Import started in background'))
+            return HttpResponseRedirect(self.get_changelist_url())
+
+    def export_job_action(self, request, *args, **kwargs):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        if not self.use_background_jobs():
+            opts = self.model._meta
+            params = request.GET.copy()
+            params['format'] = 'csv'
+            return HttpResponseRedirect('%s?%s' % (reverse(
+                'admin:%s_%s_export_stream' % (opts.app_label,
+                                               opts.module_name),
+                current_app=self.admin_site.name), params.urlencode()))
+        try:
+            job_id = start_job('export', run_export,
+                               self.get_export_queryset(request),
+                               self.get_export_stream_fields(),
+                               self.export_chunk_size)
+        except JobQueueFull:
+            messages.error(request, _('Too many jobs, try again later'))
+        else:
+            self.remember_job(request, job_id)
+            messages.info(request, _('Export started in background'))
+        return HttpResponseRedirect(self.get_changelist_url())
+
+    def job_progress_view(self, request, job_id):
+        job = dict(self.get_user_job(request, job_id))
+        # Don't leak server file paths
+        job['result'] = job['result'] if job['name'] == 'import' else None
+        return HttpResponse(json.dumps(job), content_type='application/json')
+
+    def job_download_view(self, request, job_id):
+        job = self.get_user_job(request, job_id)
+        if job['status'] != DONE or job['name'] != 'export':
+            raise Http404
+        try:
+            export_file = open(job['result']['file'], 'rb')
+        except IOError:
+            # Already downloaded
+            raise Http404
+        response = StreamingHttpResponse(RemovingFileWrapper(export_file),
+                                         content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename=%s.csv' % (
+            self.model.__name__)
+        return response
@@ -0,0 +1,122 @@
+from django.db import connections, DatabaseError
+from django.db.models import get_models
+from django.db.models.signals import post_syncdb
+from reversion import models as reversion_models
+from reversion.models import Version
+
+from .. import models as example_models
+from ..models import SearchTextModel
+from ..search import search_table_name
+
+
+def create_search_text_indexes(sender, db='default', **kwargs):
+    """
+    Trigram indexes for admin search, which is UPPER(search_text::text) LIKE
+    UPPER('%term%') on PostgreSQL. Created only if the pg_trgm extension is
+    installed. SQLite gets FTS5 trigram search tables if it supports them,
+    other databases scan search_text.
+    """
+    connection = connections[db]
+    if connection.vendor == 'sqlite':
+        return create_search_tables(sender, connection)
+    if connection.vendor != 'postgresql':
+        return
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    if cursor.fetchone() is None:
+        return
+    for model in get_models(sender):
+        if not issubclass(model, SearchTextModel):
+            continue
+        table = model._meta.db_table
+        name = '%s_search_text_trgm' % table
+        cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s',
+                       [name])
+        if cursor.fetchone() is None:
+            cursor.execute(
+                'CREATE INDEX %s ON %s USING gin (UPPER(%s::text) '
+                'gin_trgm_ops)' % (qn(name), qn(table), qn('search_text')))
+
+
+#: triggers keeping an FTS5 table with external content current
+SEARCH_TABLE_TRIGGERS = (
+    ('insert', 'AFTER INSERT', 'INSERT INTO {search}(rowid, {column}) '
+     'VALUES (new.{pk}, new.{column});'),
+    ('delete', 'AFTER DELETE', "INSERT INTO {search}({search}, rowid, "
+     "{column}) VALUES ('delete', old.{pk}, old.{column});"),
+    ('update', 'AFTER UPDATE OF {column}', "INSERT INTO {search}({search}, "
+     "rowid, {column}) VALUES ('delete', old.{pk}, old.{column}); "
+     "INSERT INTO {search}(rowid, {column}) VALUES (new.{pk}, new.{column});"),
+)
+
+
+def create_search_tables(sender, connection):
+    """
+    FTS5 trigram tables of search_text, see search.py
+    """
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    for model in get_models(sender):
+        if not issubclass(model, SearchTextModel):
+            continue
+        names = {'table': qn(model._meta.db_table),
+                 'search': qn(search_table_name(model)),
+                 'pk': qn(model._meta.pk.column),
+                 'column': qn('search_text')}
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND "
+                       "name = %s", [search_table_name(model)])
+        if cursor.fetchone() is not None:
+            continue
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE {search} USING fts5({column}, "
+                "content={table}, content_rowid={pk}, "
+                "tokenize='trigram')".format(**names))
+        except DatabaseError:
+            # No FTS5 or its trigram tokenizer (SQLite < 3.34)
+            return
+        for action, when, body in SEARCH_TABLE_TRIGGERS:
+            cursor.execute('CREATE TRIGGER {name} {when} ON {table} BEGIN '
+                           '{body} END'.format(
+                               name=qn('%s_%s' % (search_table_name(model),
+                                                  action)),
+                               when=when.format(**names), table=names['table'],
+                               body=body.format(**names)))
+        cursor.execute("INSERT INTO {search}({search}) VALUES "
+                       "('rebuild')".format(**names))
+
+
+#: per vendor queries returning a row if the index named %s exists
+INDEX_EXISTS_SQL = {
+    'postgresql': 'SELECT 1 FROM pg_indexes WHERE indexname = %s',
+    'sqlite': "SELECT 1 FROM sqlite_master WHERE type = 'index' AND "
+              "name = %s",
+    'mysql': 'SELECT 1 FROM information_schema.statistics WHERE '
+             'table_schema = DATABASE() AND index_name = %s',
+    'oracle': 'SELECT 1 FROM user_indexes WHERE index_name = UPPER(%s)',
+}
+
+
+def create_version_history_index(sender, db='default', **kwargs):
+    """
+    Index of the paginated history view, versions of one object in id
+    order. Reversion indexes object_id_int on its own only.
+    """
+    connection = connections[db]
+    if connection.vendor not in INDEX_EXISTS_SQL:
+        return
+    qn = connection.ops.quote_name
+    table = Version._meta.db_table
+    name = '%s_history' % table
+    cursor = connection.cursor()
+    cursor.execute(INDEX_EXISTS_SQL[connection.vendor], [name])
+    if cursor.fetchone() is None:
+        columns = [Version._meta.get_field(field).column for field in
+                   ('content_type', 'object_id_int', 'id')]
+        cursor.execute('CREATE INDEX %s ON %s (%s)' % (
+            qn(name), qn(table), ', '.join(map(qn, columns))))
+
+
+post_syncdb.connect(create_search_text_indexes, sender=example_models)
+post_syncdb.connect(create_version_history_index, sender=reversion_models)
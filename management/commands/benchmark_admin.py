@@ -0,0 +1,233 @@
+import json
+import time
+from optparse import make_option
+
+from django.contrib import admin
+from django.contrib.admin import SimpleListFilter
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.client import Client, RequestFactory
+from django.test.utils import setup_test_environment, \
+    teardown_test_environment
+from django.utils.encoding import force_text
+from django.utils.html_parser import HTMLParser
+from django.utils.http import urlencode
+
+BENCHMARK_USER = 'admin_benchmark'
+
+
+class FormDataParser(HTMLParser):
+    """
+    Collects the values a browser would submit with the forms of a page
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.data = []
+        self.select = self.textarea = None
+        self.text = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        name = attrs.get('name')
+        if tag == 'input' and name:
+            kind = attrs.get('type', 'text').lower()
+            if kind in ('submit', 'button', 'image', 'file', 'reset'):
+                return
+            if kind in ('checkbox', 'radio') and 'checked' not in attrs:
+                return
+            self.data.append((name, attrs.get('value', 'on' if kind in (
+                'checkbox', 'radio') else '')))
+        elif tag == 'select' and name:
+            self.select = name
+        elif tag == 'option' and self.select and 'selected' in attrs:
+            self.data.append((self.select, attrs.get('value', '')))
+        elif tag == 'textarea' and name:
+            self.textarea, self.text = name, []
+
+    def handle_endtag(self, tag):
+        if tag == 'select':
+            self.select = None
+        elif tag == 'textarea' and self.textarea:
+            self.data.append((self.textarea, ''.join(self.text)))
+            self.textarea = None
+
+    def handle_data(self, data):
+        if self.textarea:
+            self.text.append(data)
+
+    def handle_entityref(self, name):
+        self.handle_data(self.unescape('&%s;' % name))
+
+    def handle_charref(self, name):
+        self.handle_data(self.unescape('&#%s;' % name))
+
+
+def percentile(values, percent):
+    """
+    Nearest rank percentile of sorted values
+    """
+    index = max(int(round(percent / 100.0 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class Command(BaseCommand):
+    args = '<app_label.ModelName ...>'
+    help = ('Times changelist, list_editable save, search, filter, change '
+            'form and save of registered admins and prints latency '
+            'percentiles and query counts as JSON. Saves write to the '
+            'database, use a copy filled with generate_examples')
+    option_list = BaseCommand.option_list + (
+        make_option('--repeat', type='int', default=10,
+                    help='Timed requests per scenario'),
+        make_option('--output', default=None,
+                    help='Write JSON to this file instead of stdout'),
+        make_option('--no-save', action='store_false', dest='save',
+                    default=True,
+                    help='Skip change form and changelist saves'),
+    )
+
+    def handle(self, *labels, **options):
+        self.repeat = options['repeat']
+        if self.repeat < 1:
+            raise CommandError('--repeat must be at least 1')
+        admin.autodiscover()
+        admins = [(model, model_admin) for model, model_admin in
+                  sorted(admin.site._registry.items(),
+                         key=lambda item: self.label(item[0]))
+                  if self.label(model) in labels or
+                  (not labels and model._meta.app_label == 'examples')]
+
+        setup_test_environment()
+        connection.use_debug_cursor = True
+        try:
+            self.client = Client()
+            self.login()
+            results = []
+            for model, model_admin in admins:
+                for scenario, method, url, data in self.get_scenarios(
+                        model, model_admin, options['save']):
+                    result = self.measure(method, url, data)
+                    result.update(admin=self.label(model),
+                                  scenario=scenario, url=url)
+                    if data and 'form-TOTAL_FORMS' in data:
+                        rows = int(data['form-TOTAL_FORMS'][0])
+                        result.update(rows=rows, rows_per_s=round(
+                            rows / max(result['p50_ms'], 0.01) * 1000, 1))
+                    results.append(result)
+        finally:
+            connection.use_debug_cursor = None
+            teardown_test_environment()
+
+        output = json.dumps({'repeat': self.repeat, 'results': results},
+                            indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+    def label(self, model):
+        return '%s.%s' % (model._meta.app_label, model._meta.object_name)
+
+    def login(self):
+        user, created = User.objects.get_or_create(username=BENCHMARK_USER)
+        user.is_staff = user.is_superuser = True
+        user.set_password(BENCHMARK_USER)
+        user.save()
+        self.user = user
+        self.client.login(username=BENCHMARK_USER, password=BENCHMARK_USER)
+
+    def url(self, model, view, *args):
+        return reverse('admin:%s_%s_%s' % (model._meta.app_label,
+                                           model._meta.module_name, view),
+                       args=args)
+
+    def get_scenarios(self, model, model_admin, save):
+        changelist = self.url(model, 'changelist')
+        yield 'changelist', 'get', changelist, None
+
+        obj = model._default_manager.order_by('pk')[:1]
+        obj = obj[0] if obj else None
+        if model_admin.search_fields and obj is not None:
+            # Search for a word of the first object, so there are matches
+            term = force_text(obj).split(' ')[0].lower()
+            yield 'search', 'get', '%s?q=%s' % (changelist, term), None
+
+        if model_admin.list_editable and save and obj is not None:
+            # Posts every row of the page unchanged, rows/s is reported
+            yield ('changelist_save', 'post', changelist,
+                   self.get_form_data(changelist))
+
+        lookup = self.get_filter_lookup(model, model_admin, obj)
+        if lookup:
+            yield 'filter', 'get', '%s?%s' % (changelist,
+                                              urlencode(lookup)), None
+
+        if obj is not None:
+            change = self.url(model, 'change', obj.pk)
+            yield 'change_form', 'get', change, None
+            if save:
+                yield 'save', 'post', change, self.get_form_data(change)
+
+    def get_filter_lookup(self, model, model_admin, obj):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        for list_filter in model_admin.get_list_filter(request):
+            if isinstance(list_filter, (tuple, list)):
+                list_filter = list_filter[0]
+            if isinstance(list_filter, type):
+                if not issubclass(list_filter, SimpleListFilter):
+                    continue
+                spec = list_filter(request, {}, model, model_admin)
+                choices = spec.lookup_choices
+                if choices:
+                    return {spec.parameter_name: choices[0][0]}
+            elif obj is not None and '__' not in list_filter:
+                field = model._meta.get_field(list_filter)
+                value = getattr(obj, field.attname)
+                if value is not None:
+                    return {'%s__exact' % field.attname: value}
+
+    def get_form_data(self, url):
+        parser = FormDataParser()
+        parser.feed(self.client.get(url).content.decode('utf-8'))
+        data = {}
+        for name, value in parser.data:
+            data.setdefault(name, []).append(value)
+        data['_save'] = ['Save']
+        return data
+
+    def request(self, method, url, data):
+        if method == 'post':
+            return self.client.post(url, data)
+        return self.client.get(url)
+
+    def measure(self, method, url, data):
+        # First request fills caches and is reported on its own
+        start = time.time()
+        response = self.request(method, url, data)
+        first = (time.time() - start) * 1000
+
+        timings, queries = [], []
+        for i in range(self.repeat):
+            connection.queries = []
+            start = time.time()
+            response = self.request(method, url, data)
+            timings.append((time.time() - start) * 1000)
+            queries.append(len(connection.queries))
+        timings.sort()
+        queries.sort()
+        return {
+            'status': response.status_code,
+            'first_ms': round(first, 2),
+            'min_ms': round(timings[0], 2),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p90_ms': round(percentile(timings, 90), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'max_ms': round(timings[-1], 2),
+            'queries': percentile(queries, 50),
+            'max_queries': queries[-1],
+        }
@@ -0,0 +1,105 @@
+import json
+import time
+from optparse import make_option
+
+import reversion
+from django.contrib import admin
+from django.contrib.contenttypes.models import ContentType
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import get_model
+from reversion.models import Version
+
+from ...serializers import FORMAT
+from .benchmark_admin import percentile
+
+
+class Command(BaseCommand):
+    args = '<app_label.ModelName ...>'
+    help = ('Re-encodes stored django-reversion versions of given models '
+            'with the compact %s format' % FORMAT)
+    option_list = BaseCommand.option_list + (
+        make_option('--benchmark', action='store_true', default=False,
+                    help='Print stored size and read time of the versions '
+                         'per format as JSON, nothing is written'),
+    )
+
+    def handle(self, *labels, **options):
+        if not labels:
+            raise CommandError('Enter at least one app_label.ModelName')
+        results = {}
+        for label in labels:
+            model = get_model(*label.split('.', 1))
+            if model is None:
+                raise CommandError('Unknown model: %s' % label)
+            if options['benchmark']:
+                results[label] = self.benchmark(model)
+                continue
+            fields = self.get_fields(model)
+            if set(fields) & set(f.name for f in model._meta.many_to_many):
+                # Serializer would store current relations, not versioned
+                raise CommandError('Models with versioned many to many '
+                                   'fields are not supported: %s' % label)
+            self.compact(model, fields)
+        if options['benchmark']:
+            self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+
+    def get_fields(self, model):
+        """
+        Returns the fields reversion stores for model
+        """
+        if not reversion.is_registered(model):
+            # Models are registered by their VersionAdmin
+            admin.autodiscover()
+        if not reversion.is_registered(model):
+            raise CommandError('Model is not registered with reversion: %s' %
+                               model._meta.object_name)
+        return list(reversion.get_adapter(model).get_fields_to_serialize())
+
+    def get_versions(self, model):
+        return Version.objects.filter(
+            content_type=ContentType.objects.get_for_model(model))
+
+    def compact(self, model, fields):
+        versions = self.get_versions(model)
+        object_ids = versions.values_list('object_id', flat=True).distinct()
+        converted = 0
+        for object_id in object_ids.iterator():
+            previous = None
+            with transaction.commit_on_success():
+                for version in versions.filter(
+                        object_id=object_id).order_by('pk').iterator():
+                    if version.format != FORMAT:
+                        obj = version.object_version.object
+                        version.serialized_data = serializers.serialize(
+                            FORMAT, [obj], fields=fields, previous=previous)
+                        version.format = FORMAT
+                        version.save()
+                        converted += 1
+                    previous = version
+        self.stdout.write('%s: %s versions converted' % (
+            model._meta.object_name, converted))
+
+    def benchmark(self, model):
+        sizes, timings = {}, {}
+        for version in self.get_versions(model).order_by('pk').iterator():
+            sizes.setdefault(version.format, []).append(
+                len(version.serialized_data))
+            start = time.time()
+            version.object_version
+            timings.setdefault(version.format, []).append(
+                (time.time() - start) * 1000)
+        results = {}
+        for version_format, format_sizes in sizes.items():
+            format_timings = sorted(timings[version_format])
+            results[version_format] = {
+                'versions': len(format_sizes),
+                'bytes': sum(format_sizes),
+                'avg_bytes': round(
+                    float(sum(format_sizes)) / len(format_sizes), 1),
+                'read_p50_ms': round(percentile(format_timings, 50), 4),
+                'read_p99_ms': round(percentile(format_timings, 99), 4),
+                'read_max_ms': round(format_timings[-1], 4),
+            }
+        return results
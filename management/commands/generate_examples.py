@@ -0,0 +1,315 @@
+import datetime
+import random
+from optparse import make_option
+
+import reversion
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from reversion.models import Version
+
+from ...models import Category, City, Continent, Country, Fridge, \
+    ImportExportItem, KitchenSink, Microwave, ReversionedItem, WysiwygEditor
+from ...signals import rows_changed
+
+CONTINENTS = ('Africa', 'Antarctica', 'Asia', 'Australia', 'Europe',
+              'North America', 'South America')
+
+SYLLABLES = ('ka', 'lo', 'mi', 'ra', 'ten', 'vo', 'shi', 'ul', 'dan', 'pe',
+             'sor', 'ni', 'gra', 'et', 'bu', 'zan')
+
+
+def bulk_create(model, objects, batch_size):
+    """
+    bulk_create() which also sets primary keys of created objects, relying
+    on new rows getting increasing primary keys
+    """
+    last = model._default_manager.order_by('-pk').values_list(
+        'pk', flat=True)[:1]
+    last = last[0] if last else 0
+    model._default_manager.bulk_create(objects, batch_size)
+    pks = model._default_manager.filter(pk__gt=last).order_by(
+        'pk').values_list('pk', flat=True)
+    for obj, pk in zip(objects, pks):
+        obj.pk = pk
+    return objects
+
+
+def deep_tree(depth, siblings):
+    """
+    Chain of depth levels where every node has siblings - 1 leaf siblings
+    """
+    node = []
+    for level in range(depth):
+        node = [node] + [[] for i in range(siblings - 1)]
+    return node
+
+
+def wide_tree(width, leaves):
+    return [[[] for j in range(leaves)] for i in range(width)]
+
+
+def number_tree(children, nodes, parent=None, level=0, counter=None):
+    """
+    Appends (lft, rght, level, parent lft, position) of every node under
+    children to nodes and returns next free lft value
+    """
+    counter = counter or 2
+    for position, grandchildren in enumerate(children, 1):
+        lft = counter
+        counter = number_tree(grandchildren, nodes, lft, level + 1,
+                              counter + 1)
+        nodes.append((lft, counter, level, parent, position))
+        counter += 1
+    return counter
+
+
+class Command(BaseCommand):
+    help = ('Creates reproducible example rows for every example model. '
+            'Row counts are multiplied by --scale')
+    option_list = BaseCommand.option_list + (
+        make_option('--scale', type='int', default=1,
+                    help='Multiplier of all row counts'),
+        make_option('--seed', type='int', default=0,
+                    help='Random seed, same seed gives same rows'),
+        make_option('--history', type='int', default=10,
+                    help='Number of versions of every ReversionedItem'),
+        make_option('--tree-depth', type='int', default=200, dest='depth',
+                    help='Depth of deep Category trees, below 900'),
+        make_option('--clear', action='store_true', default=False,
+                    help='Delete existing example rows first'),
+    )
+    batch_size = 500
+
+    #: row counts for --scale 1
+    countries = 200
+    cities_per_country = 20
+    kitchen_sinks = 1000
+    inlines_per_kitchen_sink = 3
+    deep_tree_siblings = 5
+    wide_tree_width = 1000
+    wide_tree_leaves = 10
+    reversioned_items = 50
+    import_export_items = 10000
+    wysiwyg_editors = 100
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.scale = options['scale']
+        if options['clear']:
+            self.clear()
+        self.create_continents()
+        self.create_countries()
+        self.create_cities()
+        self.create_kitchen_sinks()
+        self.create_categories(options['depth'])
+        self.create_reversioned_items(options['history'])
+        self.create_import_export_items()
+        self.create_wysiwyg_editors()
+        # Rows were bulk created, which sends no signals caches listen to
+        for model in (Continent, Country, City, KitchenSink, Fridge,
+                      Microwave, Category, ReversionedItem, ImportExportItem,
+                      WysiwygEditor):
+            rows_changed.send(sender=model)
+
+    def report(self, model, count):
+        self.stdout.write('%s: %s rows created' % (model._meta.object_name,
+                                                   count))
+
+    def word(self, syllables=3):
+        return ''.join(self.random.choice(SYLLABLES)
+                       for i in range(syllables)).capitalize()
+
+    def date(self, start_year=1800, end_year=2020):
+        start = datetime.date(start_year, 1, 1).toordinal()
+        end = datetime.date(end_year, 12, 31).toordinal()
+        return datetime.date.fromordinal(self.random.randint(start, end))
+
+    def clear(self):
+        with transaction.commit_on_success():
+            for model in (Fridge, Microwave, KitchenSink, City, Country,
+                          Continent, Category, ImportExportItem,
+                          WysiwygEditor, ReversionedItem):
+                model._default_manager.all().delete()
+            Version.objects.filter(
+                content_type=ContentType.objects.get_for_model(
+                    ReversionedItem)).delete()
+
+    def create_continents(self):
+        created = 0
+        for order, name in enumerate(CONTINENTS, 1):
+            created += Continent.objects.get_or_create(
+                name=name, defaults={'order': order})[1]
+        self.report(Continent, created)
+
+    def create_countries(self):
+        continents = list(Continent.objects.order_by('pk'))
+        countries = []
+        for i in range(self.countries * self.scale):
+            country = Country(
+                name='%s %s' % (self.word(), i),
+                code=self.word(1)[:2].upper(),
+                independence_day=self.date() if i % 4 else None,
+                continent=self.random.choice(continents),
+                area=self.random.randint(1000, 10 ** 7),
+                population=self.random.randint(10 ** 4, 10 ** 9),
+                order=i,
+                description=' '.join(self.word() for j in range(20)))
+            country.search_text = country.get_search_text()
+            countries.append(country)
+        with transaction.commit_on_success():
+            bulk_create(Country, countries, self.batch_size)
+        self.report(Country, len(countries))
+
+    def create_cities(self):
+        created = 0
+        countries = Country.objects.order_by('pk').only('pk', 'name')
+        for country in countries.iterator():
+            cities = []
+            for i in range(self.cities_per_country):
+                city = City(name='%s %s' % (self.word(), i), country=country,
+                            capital=not i,
+                            area=self.random.randint(10, 10 ** 4),
+                            population=self.random.randint(10 ** 3, 10 ** 7))
+                city.search_text = city.get_search_text()
+                cities.append(city)
+            with transaction.commit_on_success():
+                City.objects.bulk_create(cities, self.batch_size)
+            created += len(cities)
+        self.report(City, created)
+
+    def create_kitchen_sinks(self):
+        countries = list(Country.objects.values_list('pk', flat=True))
+        european = list(Country.objects.filter(
+            continent__name='Europe').values_list('pk', flat=True))
+        sinks = []
+        for i in range(self.kitchen_sinks * self.scale):
+            sink = KitchenSink(
+                name='%s %s' % (self.word(), i),
+                help_text=self.word(),
+                multiple_in_row=self.word(),
+                textfield=' '.join(self.word() for j in range(30)),
+                date=self.date(2000),
+                date_and_time=datetime.datetime.combine(
+                    self.date(2000),
+                    datetime.time(self.random.randint(0, 23))),
+                boolean=self.random.random() < 0.5,
+                boolean_with_help=self.random.random() < 0.5,
+                horizontal_choices=self.random.randint(1, 4),
+                vertical_choices=self.random.randint(1, 3),
+                choices=self.random.randint(1, 3),
+                hidden_checkbox=self.random.random() < 0.5,
+                country_id=self.random.choice(countries),
+                linked_foreign_key_id=self.random.choice(
+                    european or countries))
+            sink.search_text = sink.get_search_text()
+            sinks.append(sink)
+
+        with transaction.commit_on_success():
+            bulk_create(KitchenSink, sinks, self.batch_size)
+            fridges, microwaves = [], []
+            for sink in sinks:
+                for order in range(1, self.inlines_per_kitchen_sink + 1):
+                    fridges.append(Fridge(
+                        kitchensink_id=sink.pk, name=self.word(),
+                        type=self.random.randint(1, 3),
+                        is_quiet=self.random.random() < 0.5, order=order))
+                    microwaves.append(Microwave(
+                        kitchensink_id=sink.pk, name=self.word(),
+                        type=self.random.randint(1, 3),
+                        is_compact=self.random.random() < 0.5, order=order))
+            Fridge.objects.bulk_create(fridges, self.batch_size)
+            Microwave.objects.bulk_create(microwaves, self.batch_size)
+        self.report(KitchenSink, len(sinks))
+        self.report(Fridge, len(fridges))
+        self.report(Microwave, len(microwaves))
+
+    def create_categories(self, depth):
+        trees = []
+        for i in range(self.scale):
+            trees.append(deep_tree(depth, self.deep_tree_siblings))
+            trees.append(wide_tree(self.wide_tree_width,
+                                   self.wide_tree_leaves))
+
+        # Tree fields are computed here, so rows are inserted level by level
+        # without MPTT updates. Parents are found by (tree_id, lft)
+        last_tree_id = Category.objects.order_by('-tree_id').values_list(
+            'tree_id', flat=True)[:1]
+        last_tree_id = last_tree_id[0] if last_tree_id else 0
+        last_order = Category.objects.filter(level=0).order_by(
+            '-order').values_list('order', flat=True)[:1]
+        last_order = last_order[0] if last_order else 0
+        levels = {}
+        for tree_id, children in enumerate(trees, last_tree_id + 1):
+            nodes = []
+            rght = number_tree(children, nodes)
+            name = self.word()
+            levels.setdefault(0, []).append(Category(
+                name=name, slug=name.lower(), is_active=True,
+                order=last_order + tree_id, tree_id=tree_id, lft=1,
+                rght=rght, level=0))
+            for lft, rght, level, parent, position in nodes:
+                name = '%s %s' % (self.word(), lft)
+                levels.setdefault(level + 1, []).append(Category(
+                    name=name, slug=name.lower().replace(' ', '-'),
+                    is_active=self.random.random() < 0.9, order=position,
+                    tree_id=tree_id, lft=lft, rght=rght, level=level + 1,
+                    parent_id=parent or 1))
+
+        created = 0
+        parents = {}
+        with transaction.commit_on_success():
+            for level in sorted(levels):
+                for category in levels[level]:
+                    if level:
+                        category.parent_id = parents[(category.tree_id,
+                                                      category.parent_id)]
+                Category.objects.bulk_create(levels[level], self.batch_size)
+                created += len(levels[level])
+                parents = dict(((tree_id, lft), pk) for tree_id, lft, pk in
+                               Category.objects.filter(
+                                   level=level,
+                                   tree_id__gt=last_tree_id).values_list(
+                                       'tree_id', 'lft', 'pk'))
+        self.report(Category, created)
+
+    def create_reversioned_items(self, history):
+        # Versions are stored in the format set up by the admin
+        from ... import admin  # NOQA
+        created = 0
+        for i in range(self.reversioned_items * self.scale):
+            item = ReversionedItem(name='%s %s' % (self.word(), i))
+            for version in range(history):
+                with reversion.create_revision():
+                    item.quality = self.random.randint(1, 4)
+                    item.is_active = self.random.random() < 0.5
+                    item.save()
+                    reversion.set_comment('Generated version %s' % version)
+            created += 1
+        self.report(ReversionedItem, created)
+
+    def create_import_export_items(self):
+        items = [ImportExportItem(name='%s %s' % (self.word(), i),
+                                  quality=self.random.randint(1, 4),
+                                  is_active=self.random.random() < 0.5)
+                 for i in range(self.import_export_items * self.scale)]
+        with transaction.commit_on_success():
+            ImportExportItem.objects.bulk_create(items, self.batch_size)
+        self.report(ImportExportItem, len(items))
+
+    def create_wysiwyg_editors(self):
+        editors = []
+        for i in range(self.wysiwyg_editors * self.scale):
+            paragraphs = ''.join(
+                '<p>%s <strong>%s</strong></p>' % (
+                    ' '.join(self.word() for j in range(40)), self.word())
+                for k in range(5))
+            editor = WysiwygEditor(name='%s %s' % (self.word(), i),
+                                   redactor=paragraphs, redactor2=paragraphs,
+                                   ckeditor=paragraphs)
+            editor.render_html()
+            editor.search_text = editor.get_search_text()
+            editors.append(editor)
+        with transaction.commit_on_success():
+            WysiwygEditor.objects.bulk_create(editors, self.batch_size)
+        self.report(WysiwygEditor, len(editors))
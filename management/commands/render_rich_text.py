@@ -0,0 +1,71 @@
+import json
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...models import WysiwygEditor
+from ...richtext import render_html
+from .benchmark_admin import percentile
+
+
+class Command(BaseCommand):
+    help = ('Renders sanitized html, text and search text of WysiwygEditor '
+            'rows whose editor fields changed since they were rendered')
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', default=500,
+                    dest='batch_size', help='Rows read per query'),
+        make_option('--benchmark', action='store_true', default=False,
+                    help='Time rendering of the first --batch-size rows '
+                         'against reading their stored html and print '
+                         'JSON, nothing is written'),
+    )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['benchmark']:
+            return self.benchmark(batch_size)
+        queryset = WysiwygEditor.objects.order_by('pk').only(
+            'pk', 'name', 'html_hash', *WysiwygEditor.rich_text_fields)
+        fields = ['%s_html' % name for name in WysiwygEditor.rich_text_fields]
+        fields += ['text', 'html_hash', 'search_text']
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            with transaction.commit_on_success():
+                for obj in batch:
+                    if obj.render_html():
+                        obj.search_text = obj.get_search_text()
+                        WysiwygEditor.objects.filter(pk=obj.pk).update(
+                            **dict((name, getattr(obj, name))
+                                   for name in fields))
+                        updated += 1
+            last_pk = batch[-1].pk
+        self.stdout.write('WysiwygEditor: %s rows updated' % updated)
+
+    def benchmark(self, limit):
+        rows = list(WysiwygEditor.objects.order_by('pk')[:limit])
+        rendered, stored = [], []
+        for obj in rows:
+            start = time.time()
+            for name in obj.rich_text_fields:
+                render_html(getattr(obj, name))
+            rendered.append((time.time() - start) * 1000)
+            start = time.time()
+            ''.join(getattr(obj, '%s_html' % name)
+                    for name in obj.rich_text_fields)
+            stored.append((time.time() - start) * 1000)
+        results = {'rows': len(rows)}
+        for label, timings in (('render', rendered), ('stored', stored)):
+            timings.sort()
+            results[label] = {
+                'total_ms': round(sum(timings), 2),
+                'p50_ms': round(percentile(timings, 50), 4),
+                'p99_ms': round(percentile(timings, 99), 4),
+                'max_ms': round(timings[-1], 4),
+            } if timings else None
+        self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
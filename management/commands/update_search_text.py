@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...models import City, Country, KitchenSink
+
+
+class Command(BaseCommand):
+    help = 'Fills search_text of existing Country, City and KitchenSink rows'
+    batch_size = 1000
+
+    def handle(self, *args, **options):
+        for model in (Country, City, KitchenSink):
+            self.update(model)
+
+    def update(self, model):
+        updated = 0
+        last_pk = 0
+        queryset = model._default_manager.order_by('pk')
+        if model is City:
+            queryset = queryset.select_related('country')
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:self.batch_size])
+            if not batch:
+                break
+            with transaction.commit_on_success():
+                for obj in batch:
+                    search_text = obj.get_search_text()
+                    if obj.search_text != search_text:
+                        model._default_manager.filter(pk=obj.pk).update(
+                            search_text=search_text)
+                        updated += 1
+            last_pk = batch[-1].pk
+        self.stdout.write('%s: %s rows updated' % (
+            model._meta.object_name, updated))
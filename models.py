@@ -1,11 +1,49 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils.encoding import force_text
 from mptt.fields import TreeForeignKey
 from mptt.models import MPTTModel
+from reversion.models import Version
+
+from .richtext import content_hash, render_html
+from .serializers import register as register_delta_format, rekey_deltas
+from .sortables import bulk_update_field
+
+
+class SearchTextModel(models.Model):
+    """
+    Keeps lowercased values of search_text_fields in search_text column, so
+    admin search is a lookup on one column instead of an OR-chain of
+    icontains lookups with joins
+    """
+    search_text = models.TextField(blank=True, editable=False)
+
+    search_text_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def get_search_text(self):
+        values = []
+        for path in self.search_text_fields:
+            value = self
+            for attr in path.split('__'):
+                value = getattr(value, attr, None)
+            if value:
+                values.append(force_text(value))
+        # Search terms never contain spaces, so joining with space keeps
+        # results the same as searching every field on its own
+        return ' '.join(values).lower()
+
+    def save(self, *args, **kwargs):
+        self.search_text = self.get_search_text()
+        super(SearchTextModel, self).save(*args, **kwargs)
 
 
 class Continent(models.Model):
-    name = models.CharField(max_length=256)
-    order = models.PositiveIntegerField()
+    name = models.CharField(max_length=256, db_index=True)
+    order = models.PositiveIntegerField(db_index=True)
 
     def __unicode__(self):
         return self.name
@@ -17,12 +55,12 @@ class Continent(models.Model):
         return super(Continent, self).save(force_insert, force_update, using)
 
 
-class Country(models.Model):
-    name = models.CharField(max_length=256)
+class Country(SearchTextModel):
+    name = models.CharField(max_length=256, db_index=True)
     code = models.CharField(max_length=2,
                             help_text='ISO 3166-1 alpha-2 - two character '
                                       'country code')
-    independence_day = models.DateField(blank=True, null=True)
+    independence_day = models.DateField(blank=True, null=True, db_index=True)
     continent = models.ForeignKey(Continent, null=True)
     area = models.BigIntegerField(blank=True, null=True)
     population = models.BigIntegerField(blank=True, null=True)
@@ -32,12 +70,15 @@ class Country(models.Model):
                                              'lines')
     architecture = models.TextField(blank=True)
 
+    search_text_fields = ('name', 'code')
+
     def __unicode__(self):
         return self.name
 
     class Meta:
         ordering = ['name']
         verbose_name_plural = "Countries"
+        index_together = [('continent', 'order')]
 
 
 TYPE_CHOICES = ((1, 'Awesome'), (2, 'Good'), (3, 'Normal'), (4, 'Bad'))
@@ -45,7 +86,7 @@ TYPE_CHOICES2 = ((1, 'Hot'), (2, 'Normal'), (3, 'Cold'))
 TYPE_CHOICES3 = ((1, 'Tall'), (2, 'Normal'), (3, 'Short'))
 
 
-class KitchenSink(models.Model):
+class KitchenSink(SearchTextModel):
     name = models.CharField(max_length=64)
     help_text = models.CharField(max_length=64,
                                  help_text="Enter fully qualified name")
@@ -59,7 +100,7 @@ class KitchenSink(models.Model):
     file = models.FileField(upload_to='.', blank=True)
     readonly_field = models.CharField(max_length=127, default='Some value here')
 
-    date = models.DateField(blank=True, null=True)
+    date = models.DateField(blank=True, null=True, db_index=True)
     date_and_time = models.DateTimeField(blank=True, null=True)
 
     date_widget = models.DateField(blank=True, null=True)
@@ -80,7 +121,8 @@ class KitchenSink(models.Model):
                                                           "vertical choices")
     choices = models.SmallIntegerField(choices=TYPE_CHOICES3,
                                        default=3,
-                                       help_text="Help text")
+                                       help_text="Help text",
+                                       db_index=True)
     hidden_checkbox = models.BooleanField()
     hidden_choice = models.SmallIntegerField(choices=TYPE_CHOICES3,
                                              default=2, blank=True)
@@ -97,6 +139,8 @@ class KitchenSink(models.Model):
     enclosed1 = models.CharField(max_length=64, blank=True)
     enclosed2 = models.CharField(max_length=64, blank=True)
 
+    search_text_fields = ('name',)
+
     def __unicode__(self):
         return self.name
 
@@ -111,6 +155,7 @@ class Fridge(models.Model):
 
     class Meta:
         ordering = ('order',)
+        index_together = [('kitchensink', 'order')]
 
     def __unicode__(self):
         return self.name
@@ -127,6 +172,7 @@ class Microwave(models.Model):
 
     class Meta:
         ordering = ('order',)
+        index_together = [('kitchensink', 'order')]
 
     def __unicode__(self):
         return self.name
@@ -159,22 +205,20 @@ class Category(MPTTModel):
     class MPTTMeta:
         order_insertion_by = ['order']
 
-    def save(self, *args, **kwargs):
-        super(Category, self).save(*args, **kwargs)
-        Category.objects.rebuild()
-
 
 #
 # Django-select2
 # https://github.com/applegrew/django-select2
 #
-class City(models.Model):
+class City(SearchTextModel):
     name = models.CharField(max_length=64)
     country = models.ForeignKey(Country)
-    capital = models.BooleanField()
+    capital = models.BooleanField(db_index=True)
     area = models.BigIntegerField(blank=True, null=True)
     population = models.BigIntegerField(blank=True, null=True)
 
+    search_text_fields = ('name', 'country__name')
+
     def __unicode__(self):
         return self.name
 
@@ -183,15 +227,78 @@ class City(models.Model):
         unique_together = ('name', 'country')
 
 
-class WysiwygEditor(models.Model):
+@receiver(post_init, sender=Country)
+def remember_country_name(sender, instance, **kwargs):
+    # Deferred names are not loaded, their old value stays unknown
+    if 'name' in instance.__dict__:
+        instance._search_text_old_name = instance.name
+
+
+@receiver(post_save, sender=Country)
+def update_city_search_text(sender, instance, created, **kwargs):
+    # Country name is part of search text of its cities. Texts are computed
+    # like save() does and written with one UPDATE, on renames only
+    renamed = getattr(instance, '_search_text_old_name', None) != instance.name
+    instance._search_text_old_name = instance.name
+    if created or not renamed:
+        return
+    values = {}
+    for city in City.objects.filter(country=instance).only('pk', 'name'):
+        city.country = instance
+        values[city.pk] = city.get_search_text()
+    bulk_update_field(City, 'search_text', values)
+
+
+class WysiwygEditor(SearchTextModel):
     name = models.CharField(max_length=64)
     redactor = models.TextField(verbose_name='Redactor small', blank=True)
     redactor2 = models.TextField(verbose_name='Redactor2', blank=True)
     ckeditor = models.TextField(verbose_name='CKEditor', blank=True)
 
+    # Sanitized versions of editor fields, rendered when sources change
+    redactor_html = models.TextField(blank=True, editable=False)
+    redactor2_html = models.TextField(blank=True, editable=False)
+    ckeditor_html = models.TextField(blank=True, editable=False)
+    text = models.TextField(blank=True, editable=False)
+    html_hash = models.CharField(max_length=40, blank=True, editable=False)
+
+    rich_text_fields = ('redactor', 'redactor2', 'ckeditor')
+    search_text_fields = ('name', 'text')
+
     def __unicode__(self):
         return self.name
 
+    def get_html_hash(self):
+        return content_hash(*[getattr(self, name)
+                              for name in self.rich_text_fields])
+
+    def render_html(self):
+        """
+        Fills _html fields and text from editor fields, returns False if
+        they were already rendered from current values
+        """
+        html_hash = self.get_html_hash()
+        if html_hash == self.html_hash:
+            return False
+        texts = []
+        for name in self.rich_text_fields:
+            html, text = render_html(getattr(self, name))
+            setattr(self, '%s_html' % name, html)
+            texts.append(text)
+        self.text = ' '.join(text for text in texts if text)
+        self.html_hash = html_hash
+        return True
+
+    def save(self, *args, **kwargs):
+        self.render_html()
+        super(WysiwygEditor, self).save(*args, **kwargs)
+
+
+# Registered and connected here, so versions stored in the delta format are
+# readable wherever models are loaded, deleterevisions included
+register_delta_format()
+post_delete.connect(rekey_deltas, sender=Version)
+
 
 class ReversionedItem(models.Model):
     name = models.CharField(max_length=64)
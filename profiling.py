@@ -0,0 +1,243 @@
+"""
+Opt-in profiling of admin views.
+
+Set EXAMPLES_ADMIN_PROFILING = True to have ProfilingMixin admins record SQL
+count and time, duplicated queries, template block, widget, inline formset
+and admin callable (list_display, suit_row_attributes,
+suit_cell_attributes) timings of every changelist, add and change view.
+Timings are sent in a Server-Timing header and aggregated per process at
+profiling-stats/. Nothing is wrapped while profiling is disabled. Block
+timings include nested blocks.
+"""
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.conf.urls import patterns, url
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.forms.forms import BoundField
+from django.http import HttpResponse
+from django.template.loader_tags import BlockNode
+
+PROFILING = getattr(settings, 'EXAMPLES_ADMIN_PROFILING', False)
+#: number of Server-Timing entries sent, slowest first
+SERVER_TIMING_ENTRIES = 20
+
+_local = threading.local()
+_lock = threading.Lock()
+_installed = []
+
+#: per process totals by admin view
+stats = defaultdict(lambda: {
+    'requests': 0, 'total_ms': 0.0, 'queries': 0, 'sql_ms': 0.0,
+    'duplicate_queries': 0, 'similar_queries': 0,
+    'timings': defaultdict(lambda: {'count': 0, 'ms': 0.0}),
+})
+
+
+def current_profile():
+    return getattr(_local, 'profile', None)
+
+
+def timed(func, name):
+    """
+    Wraps func to add its run time to the current profile as name, which
+    may be a callable taking the same arguments as func
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = current_profile()
+        if profile is None:
+            return func(*args, **kwargs)
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.add(name(*args, **kwargs) if callable(name) else name,
+                        time.time() - start)
+    return wrapper
+
+
+def install_hooks():
+    """
+    Times every template block and widget render, while a profile is active
+    """
+    with _lock:
+        if _installed:
+            return
+        BlockNode.render = timed(BlockNode.render,
+                                 lambda node, context: 'block:%s' % node.name)
+        BoundField.as_widget = timed(
+            BoundField.as_widget, lambda field, widget=None, *args, **kwargs:
+            'widget:%s' % type(widget or field.field.widget).__name__)
+        _installed.append(True)
+
+
+class Profile(object):
+    def __init__(self):
+        self.timings = defaultdict(lambda: [0, 0.0])
+        self.queries = []
+        self.total = 0.0
+
+    def add(self, name, seconds):
+        timing = self.timings[name]
+        timing[0] += 1
+        timing[1] += seconds
+
+    def add_queries(self, queries):
+        self.queries += [(query['sql'], float(query['time']))
+                         for query in queries]
+
+    @property
+    def sql_time(self):
+        return sum(seconds for sql, seconds in self.queries)
+
+    def count_repeated(self, normalize=None):
+        counts = defaultdict(int)
+        for sql, seconds in self.queries:
+            counts[normalize(sql) if normalize else sql] += 1
+        return sum(count - 1 for count in counts.values())
+
+    @property
+    def duplicate_queries(self):
+        return self.count_repeated()
+
+    @property
+    def similar_queries(self):
+        # Same statement with other literals, which usually means N+1
+        return self.count_repeated(
+            lambda sql: re.sub(r"\b\d+\b|'[^']*'", '?', sql))
+
+    def server_timing(self):
+        entries = [('total', self.total, ''),
+                   ('sql', self.sql_time, '%s queries, %s duplicates' % (
+                       len(self.queries), self.duplicate_queries))]
+        entries += sorted(((name, seconds, '%s calls' % count)
+                           for name, (count, seconds) in self.timings.items()),
+                          key=lambda entry: -entry[1])
+        return ', '.join('%s;dur=%.2f;desc="%s"' % (
+            re.sub(r'[^\w-]', '-', name), seconds * 1000, desc or name)
+            for name, seconds, desc in entries[:SERVER_TIMING_ENTRIES])
+
+    def record(self, key):
+        with _lock:
+            totals = stats[key]
+            totals['requests'] += 1
+            totals['total_ms'] += self.total * 1000
+            totals['queries'] += len(self.queries)
+            totals['sql_ms'] += self.sql_time * 1000
+            totals['duplicate_queries'] += self.duplicate_queries
+            totals['similar_queries'] += self.similar_queries
+            for name, (count, seconds) in self.timings.items():
+                totals['timings'][name]['count'] += count
+                totals['timings'][name]['ms'] += seconds * 1000
+
+
+class ProfilingMixin(object):
+    """
+    Use first in bases, so time of other mixins is included
+    """
+    #: defaults to EXAMPLES_ADMIN_PROFILING setting
+    profiling = PROFILING
+
+    def __init__(self, *args, **kwargs):
+        super(ProfilingMixin, self).__init__(*args, **kwargs)
+        if self.profiling:
+            install_hooks()
+            self.wrap_callables()
+
+    def wrap_callables(self):
+        names = [name for name in self.list_display
+                 if not callable(name) and not name.startswith('__') and
+                 callable(getattr(self, name, None))]
+        names += [name for name in ('suit_row_attributes',
+                                    'suit_cell_attributes')
+                  if hasattr(self, name)]
+        for name in names:
+            setattr(self, name, timed(getattr(self, name),
+                                      'callable:%s' % name))
+        self.list_display = [
+            timed(name, 'callable:%s' % name.__name__) if callable(name)
+            else name for name in self.list_display]
+
+    def get_urls(self):
+        urls = super(ProfilingMixin, self).get_urls()
+        info = self.model._meta.app_label, self.model._meta.module_name
+        my_urls = patterns(
+            '',
+            url(r'^profiling-stats/$',
+                self.admin_site.admin_view(self.profiling_stats_view),
+                name='%s_%s_profiling_stats' % info),
+        )
+        return my_urls + urls
+
+    def get_profile_key(self, view_name):
+        return '%s.%s:%s' % (self.model._meta.app_label,
+                             self.model._meta.object_name, view_name)
+
+    def profile_view(self, view_name, view, request, *args, **kwargs):
+        if not self.profiling or current_profile() is not None:
+            return view(request, *args, **kwargs)
+
+        profile = _local.profile = Profile()
+        marks = []
+        for connection in connections.all():
+            marks.append((connection, connection.use_debug_cursor,
+                          len(connection.queries)))
+            connection.use_debug_cursor = True
+        start = time.time()
+        try:
+            response = view(request, *args, **kwargs)
+            # Template blocks are rendered after the view returns
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        finally:
+            profile.total = time.time() - start
+            _local.profile = None
+            for connection, use_debug_cursor, mark in marks:
+                profile.add_queries(connection.queries[mark:])
+                connection.use_debug_cursor = use_debug_cursor
+                if not settings.DEBUG:
+                    del connection.queries[mark:]
+        profile.record(self.get_profile_key(view_name))
+        response['Server-Timing'] = profile.server_timing()
+        return response
+
+    def changelist_view(self, request, extra_context=None):
+        return self.profile_view(
+            'changelist', super(ProfilingMixin, self).changelist_view,
+            request, extra_context)
+
+    def add_view(self, request, form_url='', extra_context=None):
+        return self.profile_view(
+            'add', super(ProfilingMixin, self).add_view, request, form_url,
+            extra_context)
+
+    def change_view(self, request, object_id, form_url='',
+                    extra_context=None):
+        return self.profile_view(
+            'change', super(ProfilingMixin, self).change_view, request,
+            object_id, form_url, extra_context)
+
+    def get_formsets(self, request, obj=None):
+        for FormSet in super(ProfilingMixin, self).get_formsets(request, obj):
+            if self.profiling:
+                # Formsets construct all their forms in __init__
+                FormSet = type(FormSet.__name__, (FormSet,), {
+                    '__init__': timed(FormSet.__init__, 'inline:%s' % (
+                        FormSet.model._meta.object_name))})
+            yield FormSet
+
+    def profiling_stats_view(self, request):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        prefix = self.get_profile_key('')
+        data = dict((key[len(prefix):], value) for key, value in
+                    stats.items() if key.startswith(prefix))
+        return HttpResponse(json.dumps(data),
+                            content_type='application/json')
@@ -0,0 +1,170 @@
+"""
+Sanitized rendering of rich text editor output.
+
+render_html() keeps only whitelisted tags, attributes, inline styles and
+URL schemes, drops scripts, comments and unknown tags (keeping their text),
+closes unclosed tags and collapses whitespace. It also returns the plain
+text of the document, so previews and search don't parse HTML again.
+"""
+import hashlib
+import re
+
+from django.utils.encoding import force_text
+from django.utils.html import escape
+from django.utils.html_parser import HTMLParser
+
+ALLOWED_TAGS = frozenset([
+    'a', 'b', 'blockquote', 'br', 'caption', 'code', 'del', 'div', 'em',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'li', 'ol', 'p',
+    'pre', 's', 'span', 'strike', 'strong', 'sub', 'sup', 'table', 'tbody',
+    'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+])
+VOID_TAGS = frozenset(['br', 'hr', 'img'])
+#: tags dropped together with their content
+DROPPED_TAGS = frozenset(['script', 'style', 'iframe', 'object', 'embed',
+                          'head', 'title'])
+#: tags which separate words of the plain text
+BLOCK_TAGS = frozenset(['blockquote', 'br', 'div', 'h1', 'h2', 'h3', 'h4',
+                        'h5', 'h6', 'hr', 'li', 'p', 'pre', 'td', 'th',
+                        'tr'])
+ALLOWED_ATTRIBUTES = {
+    'a': ('href', 'title', 'target'),
+    'img': ('src', 'alt', 'title', 'width', 'height'),
+    'td': ('colspan', 'rowspan'),
+    'th': ('colspan', 'rowspan'),
+}
+#: attributes allowed on every tag
+GLOBAL_ATTRIBUTES = ('style',)
+URL_ATTRIBUTES = ('href', 'src')
+ALLOWED_SCHEMES = ('http', 'https', 'mailto')
+ALLOWED_STYLES = frozenset([
+    'background-color', 'color', 'float', 'font-style', 'font-weight',
+    'height', 'margin-left', 'text-align', 'text-decoration', 'width',
+])
+
+#: styles which may also be rgb()/rgba() colors
+COLOR_STYLES = frozenset(['background-color', 'color'])
+
+SCHEME_RE = re.compile(r'^([a-z][a-z0-9+.-]*):')
+#: no parentheses, so no url(), expression() or other functions
+STYLE_VALUE_RE = re.compile(r'^[#\w\s.,%-]+$')
+RGB_RE = re.compile(r'^rgba?\(\s*[\d.]+%?(\s*,\s*[\d.]+%?){2,3}\s*\)$')
+
+
+def clean_url(value):
+    normalized = re.sub(r'[\s\x00-\x1f]', '', value).lower()
+    match = SCHEME_RE.match(normalized)
+    if match and match.group(1) not in ALLOWED_SCHEMES:
+        return None
+    return value
+
+
+def clean_style(value):
+    declarations = []
+    for declaration in value.split(';'):
+        name, sep, style = declaration.partition(':')
+        name, style = name.strip().lower(), style.strip()
+        if name not in ALLOWED_STYLES:
+            continue
+        if STYLE_VALUE_RE.match(style) or (name in COLOR_STYLES and
+                                           RGB_RE.match(style)):
+            declarations.append('%s: %s' % (name, style))
+    return '; '.join(declarations) or None
+
+
+def clean_attributes(tag, attrs):
+    allowed = ALLOWED_ATTRIBUTES.get(tag, ()) + GLOBAL_ATTRIBUTES
+    cleaned = []
+    for name, value in attrs:
+        name = name.lower()
+        if name not in allowed or value is None:
+            continue
+        if name in URL_ATTRIBUTES:
+            value = clean_url(value)
+        elif name == 'style':
+            value = clean_style(value)
+        if value is not None:
+            cleaned.append((name, value))
+    return cleaned
+
+
+class Sanitizer(HTMLParser):
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.dropped = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropped += 1
+            return
+        if self.dropped or tag not in ALLOWED_TAGS:
+            return
+        self.html.append('<%s%s>' % (tag, ''.join(
+            ' %s="%s"' % (name, escape(value))
+            for name, value in clean_attributes(tag, attrs))))
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropped = max(self.dropped - 1, 0)
+            return
+        if self.dropped or tag not in self.open_tags:
+            return
+        # Close tags left open inside this one
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.html.append('</%s>' % open_tag)
+            if open_tag == tag:
+                break
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+
+    def handle_data(self, data):
+        if self.dropped:
+            return
+        if 'pre' not in self.open_tags:
+            data = re.sub(r'\s+', ' ', data)
+        self.html.append(escape(data))
+        self.text.append(data)
+
+    def handle_entityref(self, name):
+        self.handle_data(self.unescape('&%s;' % name))
+
+    def handle_charref(self, name):
+        self.handle_data(self.unescape('&#%s;' % name))
+
+    def close(self):
+        HTMLParser.close(self)
+        while self.open_tags:
+            self.html.append('</%s>' % self.open_tags.pop())
+
+
+def render_html(value):
+    """
+    Returns (sanitized html, plain text) of editor output
+    """
+    sanitizer = Sanitizer()
+    sanitizer.feed(force_text(value))
+    sanitizer.close()
+    html = ''.join(force_text(part) for part in sanitizer.html).strip()
+    text = re.sub(r'\s+', ' ', ''.join(sanitizer.text)).strip()
+    return html, text
+
+
+def content_hash(*values):
+    digest = hashlib.sha1()
+    for value in values:
+        digest.update(force_text(value).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
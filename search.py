@@ -0,0 +1,72 @@
+"""
+Indexed admin search of SearchTextModel search_text columns.
+
+Admin search of search_text is a search_text__icontains lookup per term,
+a LIKE '%term%' that no B-tree index serves. On PostgreSQL syncdb adds a
+trigram index the lookup uses. On SQLite syncdb adds an FTS5 trigram table
+of search_text kept current by triggers, and SearchTextMixin looks terms up
+in it instead. Other databases, and SQLite builds without FTS5 trigrams,
+scan the column as before.
+"""
+from django.db import connections, router
+
+#: (db alias, table) -> whether the search table exists
+search_tables = {}
+
+
+def search_table_name(model):
+    return '%s_search' % model._meta.db_table
+
+
+def has_search_table(model):
+    using = router.db_for_read(model)
+    table = search_table_name(model)
+    key = (connections[using].settings_dict['NAME'], table)
+    if key not in search_tables:
+        connection = connections[using]
+        exists = False
+        if connection.vendor == 'sqlite':
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                           "AND name = %s", [table])
+            exists = cursor.fetchone() is not None
+        search_tables[key] = exists
+    return search_tables[key]
+
+
+class SearchTextChangeListMixin(object):
+    def get_query_set(self, request):
+        terms = self.query.split()
+        # LIKE wildcards in terms would not be escaped in the search table
+        if (not terms or list(self.search_fields) != ['search_text'] or
+                any(c in self.query for c in '%_\\') or
+                not has_search_table(self.model)):
+            return super(SearchTextChangeListMixin, self).get_query_set(
+                request)
+        query, self.query = self.query, ''
+        try:
+            qs = super(SearchTextChangeListMixin, self).get_query_set(request)
+        finally:
+            self.query = query
+        qn = connections[qs.db].ops.quote_name
+        opts = self.model._meta
+        where = '%s.%s IN (SELECT rowid FROM %s WHERE %s LIKE %%s)' % (
+            qn(opts.db_table), qn(opts.pk.column),
+            qn(search_table_name(self.model)), qn('search_text'))
+        for term in terms:
+            qs = qs.extra(where=[where], params=['%%%s%%' % term.lower()])
+        return qs
+
+
+class SearchTextMixin(object):
+    """
+    Use with search_fields = ('search_text',) on SearchTextModel admins
+    """
+
+    def get_changelist(self, request, **kwargs):
+        ChangeListClass = super(SearchTextMixin, self).get_changelist(
+            request, **kwargs)
+        if issubclass(ChangeListClass, SearchTextChangeListMixin):
+            return ChangeListClass
+        return type('SearchTextChangeList',
+                    (SearchTextChangeListMixin, ChangeListClass), {})
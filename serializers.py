@@ -0,0 +1,183 @@
+"""
+Compact serialization format for django-reversion version storage.
+
+Every version of an object stores either a keyframe with all fields or only
+the fields that differ from the latest keyframe of that object. A new
+keyframe is written every KEYFRAME_INTERVAL versions, so any version is
+rebuilt from at most two rows. Payloads are zlib compressed when it makes
+them shorter.
+
+The format is registered by register(), called from models, and used with
+reversion_format = FORMAT on a VersionAdmin.
+
+When a keyframe is deleted (e.g. with ./manage.py deleterevisions),
+rekey_deltas turns the first remaining delta based on it into a keyframe
+and rebases the later ones on that.
+"""
+import base64
+import json
+import zlib
+
+from django.contrib.contenttypes.models import ContentType
+from django.core import serializers
+from django.core.serializers.base import DeserializationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.serializers.python import Serializer as PythonSerializer
+from django.core.serializers.python import Deserializer as PythonDeserializer
+from django.utils import six
+from django.utils.encoding import force_text
+from reversion.models import Version
+
+FORMAT = 'json_delta'
+
+#: a keyframe is stored after this many deltas
+KEYFRAME_INTERVAL = 50
+#: set to False to always store plain JSON
+COMPRESS = True
+
+
+def register():
+    """
+    Registers the format, unless SERIALIZATION_MODULES did already
+    """
+    if FORMAT not in serializers.get_serializer_formats():
+        serializers.register_serializer(FORMAT, __name__)
+
+
+def encode(payload):
+    data = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':'))
+    if COMPRESS:
+        compressed = 'z' + base64.b64encode(
+            zlib.compress(data.encode('utf-8'), 9)).decode('ascii')
+        if len(compressed) < len(data):
+            return compressed
+    return data
+
+
+def decode(data):
+    data = force_text(data)
+    if data.startswith('z'):
+        data = zlib.decompress(base64.b64decode(data[1:])).decode('utf-8')
+    return json.loads(data)
+
+
+def latest_version(obj):
+    versions = Version.objects.filter(
+        content_type=ContentType.objects.get_for_model(obj),
+        object_id=force_text(obj.pk), format=FORMAT).order_by('-pk')[:1]
+    return versions[0] if versions else None
+
+
+def load_keyframe(version_id):
+    try:
+        data = Version.objects.values_list(
+            'serialized_data', flat=True).get(pk=version_id)
+    except Version.DoesNotExist:
+        raise DeserializationError(
+            'Keyframe version %s does not exist' % version_id)
+    return decode(data)
+
+
+def changed_fields(base_fields, fields):
+    return dict((name, value) for name, value in six.iteritems(fields)
+                if name not in base_fields or base_fields[name] != value)
+
+
+def rekey_deltas(sender, instance, **kwargs):
+    """
+    post_delete handler of Version. Deltas of a deleted keyframe are stored
+    after it and before the next keyframe, deleted ones are gone already
+    """
+    if instance.format != FORMAT:
+        return
+    payload = decode(instance.serialized_data)
+    if 'base' in payload or len(payload['objects']) != 1:
+        return
+    base = payload['objects'][0]
+    versions = Version.objects.filter(
+        content_type=instance.content_type_id, object_id=instance.object_id,
+        format=FORMAT, pk__gt=instance.pk).order_by('pk')
+    keyframe = None
+    for version in versions[:KEYFRAME_INTERVAL]:
+        delta = decode(version.serialized_data)
+        if delta.get('base') != instance.pk:
+            continue
+        fields = dict(base['fields'])
+        fields.update(delta['objects'][0]['fields'])
+        if keyframe is None:
+            keyframe, keyframe_fields, count = version.pk, fields, 0
+            data = {'objects': [dict(base, fields=fields)]}
+        else:
+            count += 1
+            data = {'base': keyframe, 'n': count, 'objects': [
+                {'fields': changed_fields(keyframe_fields, fields)}]}
+        Version.objects.filter(pk=version.pk).update(
+            serialized_data=encode(data))
+
+
+class Serializer(PythonSerializer):
+    """
+    Accepts "previous" option with the Version new data is stored after,
+    defaults to the latest stored version of the object
+    """
+    internal_use_only = False
+
+    def end_object(self, obj):
+        super(Serializer, self).end_object(obj)
+        # Normalize field values to what they will look like once decoded
+        data = self.objects[-1]
+        data['fields'] = json.loads(json.dumps(data['fields'],
+                                               cls=DjangoJSONEncoder))
+        self.payload = self.get_payload(obj, data)
+
+    def get_payload(self, obj, data):
+        keyframe = {'objects': [data]}
+        if 'previous' in self.options:
+            previous = self.options['previous']
+        else:
+            previous = latest_version(obj)
+        if previous is None or previous.format != FORMAT:
+            return keyframe
+
+        previous_payload = decode(previous.serialized_data)
+        if 'base' in previous_payload:
+            base_id, count = previous_payload['base'], previous_payload['n']
+            base = load_keyframe(base_id)
+        else:
+            base_id, count, base = previous.pk, 0, previous_payload
+        if count + 1 >= KEYFRAME_INTERVAL:
+            return keyframe
+
+        changed = changed_fields(base['objects'][0]['fields'],
+                                 data['fields'])
+        return {'base': base_id, 'n': count + 1,
+                'objects': [{'fields': changed}]}
+
+    def end_serialization(self):
+        if len(self.objects) == 1:
+            payload = self.payload
+        else:
+            payload = {'objects': self.objects}
+        self.stream.write(encode(payload))
+
+    def getvalue(self):
+        return self.stream.getvalue()
+
+
+def Deserializer(stream_or_string, **options):
+    if not isinstance(stream_or_string, six.string_types + (bytes,)):
+        stream_or_string = stream_or_string.read()
+    try:
+        payload = decode(stream_or_string)
+        objects = payload['objects']
+        if 'base' in payload:
+            base = load_keyframe(payload['base'])['objects'][0]
+            fields = dict(base['fields'])
+            fields.update(objects[0]['fields'])
+            objects = [dict(base, fields=fields)]
+    except DeserializationError:
+        raise
+    except Exception as e:
+        raise DeserializationError(e)
+    for obj in PythonDeserializer(objects, **options):
+        yield obj
@@ -0,0 +1,8 @@
+"""
+Signals of the example app.
+"""
+from django.dispatch import Signal
+
+#: sent with the model as sender after its rows were written without save()
+#: and delete(), e.g. with bulk_create(), so caches of the rows are dropped
+rows_changed = Signal()
@@ -0,0 +1,213 @@
+"""
+Low write sortables.
+
+Changelist sortables submit the whole changelist formset, so every row is
+saved to move a single one. BulkReorderMixin adds a reorder/ view which
+receives only the moved rows and keeps gaps between sortable values, so a
+move usually writes just the moved row. Rows are renumbered only when there
+is no gap left between the new neighbours. Suit renumbers every sortable
+input of the changelist on submit, so the changelist formset ignores posted
+sortable values and reorder/ is the only view writing them.
+
+Sortable inlines save every reordered row and every new row with its own
+query. BulkSortableInlineMixin writes all new sortable values with a single
+UPDATE, new rows are still saved one by one.
+"""
+import json
+
+from django.conf.urls import patterns, url
+from django.core.exceptions import PermissionDenied
+from django.db import connections, router, transaction
+from django.forms.models import BaseInlineFormSet
+from django.http import HttpResponse, HttpResponseBadRequest, \
+    HttpResponseNotAllowed
+
+#: rows per UPDATE statement, keeps parameter count below SQLite limit
+BULK_UPDATE_BATCH_SIZE = 300
+
+
+def bulk_update_field(model, field_name, values):
+    """
+    Sets field_name of every row to its value in {pk: value} with one
+    UPDATE ... SET field = CASE pk WHEN ... END per batch of rows
+    """
+    opts = model._meta
+    field = opts.get_field(field_name)
+    using = router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    items = list(values.items())
+    for start in range(0, len(items), BULK_UPDATE_BATCH_SIZE):
+        batch = items[start:start + BULK_UPDATE_BATCH_SIZE]
+        params = []
+        for pk, value in batch:
+            params += [pk, field.get_db_prep_value(value, connection)]
+        params += [pk for pk, value in batch]
+        sql = 'UPDATE %s SET %s = CASE %s %s END WHERE %s IN (%s)' % (
+            qn(opts.db_table), qn(field.column), qn(opts.pk.column),
+            ' '.join(['WHEN %s THEN %s'] * len(batch)),
+            qn(opts.pk.column), ', '.join(['%s'] * len(batch)))
+        connection.cursor().execute(sql, params)
+    transaction.commit_unless_managed(using=using)
+
+
+class BulkReorderMixin(object):
+    """
+    POST reorder/ with JSON body {"moves": [[id, after_id], ...]} places
+    every id right after after_id, or first if after_id is null
+    """
+    #: distance between sortable values when rows are renumbered
+    reorder_gap = 1024
+    #: fields that must match for rows to be reordered against each other
+    reorder_scope = ()
+
+    class Media:
+        js = ('js/reorder.js',)
+
+    def get_urls(self):
+        urls = super(BulkReorderMixin, self).get_urls()
+        info = self.model._meta.app_label, self.model._meta.module_name
+        my_urls = patterns(
+            '',
+            url(r'^reorder/$',
+                self.admin_site.admin_view(self.reorder_view),
+                name='%s_%s_reorder' % info),
+        )
+        return my_urls + urls
+
+    def get_changelist_form(self, request, **kwargs):
+        Form = super(BulkReorderMixin, self).get_changelist_form(request,
+                                                                  **kwargs)
+        sortable = self.sortable
+
+        class ReorderChangeListForm(Form):
+            # Inputs are kept for Suit arrows, values are written by reorder/
+            def __init__(self, *args, **kwargs):
+                super(ReorderChangeListForm, self).__init__(*args, **kwargs)
+                self.fields[sortable].required = False
+
+            @property
+            def changed_data(self):
+                return [name for name in super(
+                    ReorderChangeListForm, self).changed_data
+                    if name != sortable]
+
+            def clean(self):
+                cleaned_data = super(ReorderChangeListForm, self).clean()
+                cleaned_data[sortable] = getattr(self.instance, sortable)
+                return cleaned_data
+
+        ReorderChangeListForm.__name__ = Form.__name__
+        return ReorderChangeListForm
+
+    def reorder_view(self, request):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        try:
+            moves = [(int(pk), int(after) if after is not None else None)
+                     for pk, after in json.loads(request.body)['moves']]
+        except (ValueError, TypeError, KeyError):
+            return HttpResponseBadRequest('Invalid moves')
+
+        with transaction.commit_on_success():
+            objects = self.model._default_manager.in_bulk(
+                [pk for pk, after in moves])
+            moved, changed = [], 0
+            for pk, after in moves:
+                if pk in objects:
+                    changed += self.move_after(objects[pk], after)
+                    moved.append(objects[pk])
+            self.after_reorder(moved)
+        return HttpResponse(json.dumps({'changed': changed}),
+                            content_type='application/json')
+
+    def get_reorder_siblings(self, obj):
+        """
+        Rows obj is ordered against, in changelist order
+        """
+        opts = self.model._meta
+        scope = dict((opts.get_field(name).attname,
+                      getattr(obj, opts.get_field(name).attname))
+                     for name in self.reorder_scope)
+        return self.model._default_manager.filter(**scope).exclude(
+            pk=obj.pk).order_by(self.sortable, '-' + opts.pk.name)
+
+    def move_after(self, obj, after_pk):
+        """
+        Moves obj after row with after_pk and returns number of written rows
+        """
+        siblings = list(self.get_reorder_siblings(obj).values_list(
+            'pk', self.sortable))
+        index = 0
+        if after_pk is not None:
+            pks = [pk for pk, value in siblings]
+            if after_pk not in pks:
+                return 0
+            index = pks.index(after_pk) + 1
+
+        lower = siblings[index - 1][1] if index else -1
+        if index < len(siblings):
+            upper = siblings[index][1]
+        else:
+            upper = lower + 2 * self.reorder_gap
+        if upper - lower >= 2:
+            value = (lower + upper) // 2
+            setattr(obj, self.sortable, value)
+            self.model._default_manager.filter(pk=obj.pk).update(
+                **{self.sortable: value})
+            return 1
+
+        # No gap left, renumber siblings writing only changed values
+        siblings.insert(index, (obj.pk, getattr(obj, self.sortable)))
+        changed = dict((pk, position * self.reorder_gap)
+                       for position, (pk, value) in enumerate(siblings, 1)
+                       if value != position * self.reorder_gap)
+        bulk_update_field(self.model, self.sortable, changed)
+        setattr(obj, self.sortable, (index + 1) * self.reorder_gap)
+        return len(changed)
+
+    def after_reorder(self, objects):
+        """
+        Called once after all moves of a request have been written
+        """
+
+
+class BulkSortableInlineFormSet(BaseInlineFormSet):
+    """
+    Unchanged forms are skipped as usual. Forms where only the sortable
+    value changed are written together with bulk_update_field(). New rows
+    are saved one by one, as bulk_create() doesn't set their primary keys,
+    which the admin log and inlines of the new rows need
+    """
+    sortable = 'order'
+
+    def save_existing_objects(self, commit=True):
+        self.sortable_values = {}
+        saved_instances = super(BulkSortableInlineFormSet,
+                                self).save_existing_objects(commit)
+        bulk_update_field(self.model, self.sortable, self.sortable_values)
+        return saved_instances
+
+    def save_existing(self, form, instance, commit=True):
+        if commit and form.changed_data == [self.sortable]:
+            value = form.cleaned_data[self.sortable]
+            setattr(instance, self.sortable, value)
+            self.sortable_values[instance.pk] = value
+            return instance
+        return super(BulkSortableInlineFormSet, self).save_existing(
+            form, instance, commit)
+
+
+class BulkSortableInlineMixin(object):
+    """
+    Use before SortableTabularInline or SortableStackedInline in bases
+    """
+    formset = BulkSortableInlineFormSet
+
+    def get_formset(self, request, obj=None, **kwargs):
+        FormSet = super(BulkSortableInlineMixin, self).get_formset(
+            request, obj, **kwargs)
+        FormSet.sortable = self.sortable
+        return FormSet
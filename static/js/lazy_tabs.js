@@ -0,0 +1,40 @@
+/**
+ * Loads inlines of suit_form_tabs tabs listed in #suit-lazy-tabs when the
+ * tab is opened for the first time
+ */
+(function ($) {
+    $(function () {
+        var $marker = $('#suit-lazy-tabs');
+        if (!$marker.length)
+            return;
+        var lazy_tabs = String($marker.data('tabs')).split(' ');
+
+        function load_tab(tab) {
+            var i = $.inArray(tab, lazy_tabs);
+            if (i == -1)
+                return;
+            lazy_tabs.splice(i, 1);
+            // Pass on query string, which may hold inline page or search
+            $.get('tab/' + tab + '/' + window.location.search, function (html) {
+                var active = $('#suit_form_tabs li.active a').attr('href');
+                var $html = $(html);
+                var $inlines = $html.filter('.suit-tab');
+                // Appending the whole response also runs inline init scripts
+                $('.tab-content-main').append($html);
+                if (active == '#' + tab) {
+                    $inlines.removeClass('hide').addClass('show');
+                } else {
+                    $inlines.removeClass('show').addClass('hide');
+                }
+            });
+        }
+
+        $('#suit_form_tabs a').click(function () {
+            load_tab($(this).attr('href').replace('#', ''));
+        });
+        var $active = $('#suit_form_tabs li.active a');
+        if ($active.length) {
+            load_tab($active.attr('href').replace('#', ''));
+        }
+    });
+}(Suit.$));
@@ -0,0 +1,133 @@
+/**
+ * Expands and collapses nodes of LazyTreeMixin changelists. Children are
+ * loaded from <id>/children/ on first expand. Inputs of loaded rows join
+ * the changelist formset, forms are numbered again after every change
+ */
+(function ($) {
+    var FORM_RE = /^form-(\d+)-/;
+
+    // Hidden inputs of changelist forms are rendered before the table, move
+    // them into their rows so rows can be renumbered and removed
+    function move_hidden_inputs($table) {
+        var $hidden = $('.hiddenfields :input');
+        $table.find('tbody tr').each(function () {
+            var $row = $(this), match = null;
+            $row.find(':input').each(function () {
+                match = match || FORM_RE.exec(this.name);
+            });
+            if (match) {
+                $row.children().last().append($hidden.filter(function () {
+                    return this.name.indexOf(match[0]) === 0;
+                }));
+            }
+        });
+    }
+
+    function renumber_forms($table) {
+        var $total = $('#id_form-TOTAL_FORMS'), count = 0;
+        if (!$total.length)
+            return;
+        $table.find('tbody tr').each(function () {
+            var $inputs = $(this).find(':input').filter(function () {
+                return FORM_RE.test(this.name);
+            });
+            if (!$inputs.length)
+                return;
+            $inputs.each(function () {
+                this.name = this.name.replace(FORM_RE, 'form-' + count + '-');
+                if (this.id) {
+                    this.id = 'id_' + this.name;
+                }
+            });
+            count++;
+        });
+        $total.val(count);
+        $('#id_form-INITIAL_FORMS').val(count);
+    }
+
+    function get_level($row) {
+        return parseInt($row.find('.tree-toggle').data('level'));
+    }
+
+    // Rows below $row which belong to its subtree
+    function get_descendants($row) {
+        var level = get_level($row), rows = [];
+        var $next = $row.next();
+        while ($next.length && get_level($next) > level) {
+            rows.push($next[0]);
+            $next = $next.next();
+        }
+        return $(rows);
+    }
+
+    function load_children($table, $row, $toggle, after) {
+        var url = $toggle.data('id') + '/children/';
+        if (after) {
+            url += '?after=' + after;
+        }
+        $.getJSON(url, function (data) {
+            var $last = $row;
+            if (after) {
+                $last = get_descendants($row).last();
+            }
+            $.each(data.rows, function (i, html) {
+                var $child = $(html);
+                $last.after($child);
+                $child.find('.suit-sortable').suit_list_sortable();
+                $last = $child;
+            });
+            renumber_forms($table);
+            if (data.after) {
+                var $more = $('<tr><td colspan="' + $row.children().length +
+                    '"><span class="tree-toggle" data-level="' +
+                    (get_level($row) + 1) + '"></span>' +
+                    '<a href="#" class="tree-more">&hellip;</a></td></tr>');
+                $more.find('.tree-more').click(function () {
+                    $more.remove();
+                    load_children($table, $row, $toggle, data.after);
+                    return false;
+                });
+                $last.after($more);
+            }
+        });
+    }
+
+    $(function () {
+        var $table = $('#result_list');
+        if (!$table.length)
+            return;
+
+        move_hidden_inputs($table);
+
+        // Search results come with their ancestors already expanded
+        $table.find('a.tree-toggle').each(function () {
+            var $toggle = $(this), $row = $toggle.closest('tr');
+            if (get_descendants($row).length) {
+                $toggle.text('-');
+            }
+        });
+
+        $table.on('click', 'a.tree-toggle', function () {
+            var $toggle = $(this), $row = $toggle.closest('tr');
+            var $descendants = get_descendants($row);
+            if ($toggle.text() == '-') {
+                $descendants.hide();
+                $toggle.text('+');
+            } else if ($toggle.data('loaded')) {
+                $descendants.show();
+                $descendants.find('a.tree-toggle').each(function () {
+                    var $row = $(this).closest('tr');
+                    $(this).text(get_descendants($row).length ? '-' : '+');
+                });
+                $toggle.text('-');
+            } else {
+                // Partial subtree of search results is replaced by full one
+                $descendants.remove();
+                renumber_forms($table);
+                $toggle.data('loaded', true).text('-');
+                load_children($table, $row, $toggle);
+            }
+            return false;
+        });
+    });
+}(Suit.$));
@@ -0,0 +1,53 @@
+/**
+ * Sends changelist sortable moves to reorder/ view right away, so moving a
+ * row writes only that row instead of saving the whole changelist formset
+ */
+(function ($) {
+    // Changelists render hidden pk inputs outside rows, find them by the
+    // form prefix of the row's sortable input
+    function get_pk($row) {
+        var name = $row.find('.suit-sortable').attr('name');
+        var prefix = name.slice(0, name.lastIndexOf('-') + 1);
+        return parseInt($('input[name="' + prefix + 'id"]').val());
+    }
+
+    function get_padding($tr) {
+        return parseInt($tr.find('th:first').css('padding-left'));
+    }
+
+    // Previous row on the same level, null if row is first among siblings
+    function get_previous_sibling($row, mptt_table) {
+        var $prev = $row.prev();
+        if (!mptt_table) {
+            return $prev.length ? $prev : null;
+        }
+        var padding = get_padding($row);
+        while ($prev.length && get_padding($prev) > padding) {
+            $prev = $prev.prev();
+        }
+        return $prev.length && get_padding($prev) === padding ? $prev : null;
+    }
+
+    $(function () {
+        var $table = $('#result_list');
+        if (!$table.length)
+            return;
+        var mptt_table = $table.hasClass('table-mptt');
+
+        $table.on('click', '.sortable', function () {
+            var $row = $(this).closest('tr');
+            var $after = get_previous_sibling($row, mptt_table);
+            $.ajax({
+                url: 'reorder/',
+                type: 'POST',
+                contentType: 'application/json',
+                data: JSON.stringify({
+                    moves: [[get_pk($row), $after ? get_pk($after) : null]]
+                }),
+                headers: {
+                    'X-CSRFToken': $('input[name=csrfmiddlewaretoken]').val()
+                }
+            });
+        });
+    });
+}(Suit.$));
@@ -0,0 +1,106 @@
+"""
+Lazy loaded suit_form_tabs inlines.
+
+Change form of an existing object renders only the inlines of the default
+(first) tab. Inlines of other tabs are fetched from <object_id>/tab/<tab>/
+when the tab is first opened, and on save only inlines whose formset was
+loaded and submitted are built and validated.
+"""
+from django.conf.urls import patterns, url
+from django.contrib.admin import helpers
+from django.contrib.admin.util import unquote
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, Http404
+from django.template import RequestContext
+from django.template.loader import render_to_string
+
+TAB_CLASS_PREFIX = 'suit-tab-'
+
+
+class LazyInlineTabsMixin(object):
+    #: tabs loaded on demand, defaults to all suit_form_tabs except the first
+    lazy_tabs = None
+    change_form_template = 'admin/examples/lazy_tabs/change_form.html'
+
+    class Media:
+        js = ('admin/js/inlines.js', 'js/lazy_tabs.js')
+
+    def get_urls(self):
+        urls = super(LazyInlineTabsMixin, self).get_urls()
+        info = self.model._meta.app_label, self.model._meta.module_name
+        my_urls = patterns(
+            '',
+            url(r'^(.+)/tab/(\w+)/$',
+                self.admin_site.admin_view(self.tab_view),
+                name='%s_%s_tab' % info),
+        )
+        return my_urls + urls
+
+    def get_lazy_tabs(self):
+        if self.lazy_tabs is not None:
+            return self.lazy_tabs
+        return [tab for tab, title in self.suit_form_tabs[1:]]
+
+    def get_inline_tab(self, inline):
+        for css_class in getattr(inline, 'suit_classes', '').split():
+            if css_class.startswith(TAB_CLASS_PREFIX):
+                return css_class[len(TAB_CLASS_PREFIX):]
+
+    def is_inline_submitted(self, request, inline, obj):
+        if request.method != 'POST':
+            return False
+        prefix = inline.get_formset(request, obj).get_default_prefix()
+        return '%s-TOTAL_FORMS' % prefix in request.POST
+
+    def get_unloaded_inlines(self, request, obj):
+        """
+        Inlines of lazy tabs, except these loaded and submitted already
+        """
+        if obj is None:
+            return []
+        lazy_tabs = self.get_lazy_tabs()
+        return [inline for inline in super(LazyInlineTabsMixin, self)
+                .get_inline_instances(request, obj)
+                if self.get_inline_tab(inline) in lazy_tabs and
+                not self.is_inline_submitted(request, inline, obj)]
+
+    def get_inline_instances(self, request, obj=None):
+        inlines = super(LazyInlineTabsMixin, self).get_inline_instances(
+            request, obj)
+        unloaded = [type(inline) for inline in
+                    self.get_unloaded_inlines(request, obj)]
+        return [inline for inline in inlines if type(inline) not in unloaded]
+
+    def render_change_form(self, request, context, *args, **kwargs):
+        obj = kwargs.get('obj')
+        context['lazy_tabs'] = set(
+            self.get_inline_tab(inline)
+            for inline in self.get_unloaded_inlines(request, obj))
+        return super(LazyInlineTabsMixin, self).render_change_form(
+            request, context, *args, **kwargs)
+
+    def tab_view(self, request, object_id, tab):
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None:
+            raise Http404
+        if not self.has_change_permission(request, obj):
+            raise PermissionDenied
+
+        html = []
+        for inline in self.get_unloaded_inlines(request, obj):
+            if self.get_inline_tab(inline) != tab:
+                continue
+            FormSet = inline.get_formset(request, obj)
+            formset = FormSet(instance=obj,
+                              prefix=FormSet.get_default_prefix(),
+                              queryset=inline.queryset(request))
+            inline_admin_formset = helpers.InlineAdminFormSet(
+                inline, formset, list(inline.get_fieldsets(request, obj)),
+                dict(inline.get_prepopulated_fields(request, obj)),
+                list(inline.get_readonly_fields(request, obj)),
+                model_admin=self)
+            html.append(render_to_string(
+                inline.template, {'inline_admin_formset': inline_admin_formset,
+                                  'opts': self.model._meta},
+                context_instance=RequestContext(request)))
+        return HttpResponse(''.join(html))
@@ -0,0 +1,104 @@
+import datetime
+
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.admin.views.main import ALL_VAR, IS_POPUP_VAR, \
+    ORDER_VAR, SEARCH_VAR, TO_FIELD_VAR
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import ugettext as _
+
+register = template.Library()
+
+#: parameters that don't filter the changelist
+NON_FILTER_VARS = (ALL_VAR, IS_POPUP_VAR, ORDER_VAR, TO_FIELD_VAR)
+
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def cached_date_hierarchy(cl):
+    """
+    Same as date_hierarchy, but reads dates from DateHistogram in
+    model_admin.date_histogram when no other filter or search is applied
+    """
+    histogram = getattr(cl.model_admin, 'date_histogram', None)
+    field_generic = '%s__' % cl.date_hierarchy
+    filtered = cl.params.get(SEARCH_VAR) or any(
+        name not in NON_FILTER_VARS and name != SEARCH_VAR and
+        not name.startswith(field_generic) for name in cl.params)
+    if not cl.date_hierarchy or histogram is None or filtered:
+        return date_hierarchy(cl)
+
+    field_name = cl.date_hierarchy
+    year_field = '%s__year' % field_name
+    month_field = '%s__month' % field_name
+    day_field = '%s__day' % field_name
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+
+    link = lambda d: cl.get_query_string(d, [field_generic])
+
+    if not (year_lookup or month_lookup or day_lookup):
+        # select appropriate start level
+        years = histogram.years()
+        if len(years) == 1:
+            year_lookup = years[0]
+            months = histogram.months(year_lookup)
+            if len(months) == 1:
+                month_lookup = months[0].month
+
+    if year_lookup and month_lookup and day_lookup:
+        day = datetime.date(int(year_lookup), int(month_lookup),
+                            int(day_lookup))
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year_lookup,
+                              month_field: month_lookup}),
+                'title': capfirst(formats.date_format(day,
+                                                      'YEAR_MONTH_FORMAT'))
+            },
+            'choices': [{
+                'title': capfirst(formats.date_format(day,
+                                                      'MONTH_DAY_FORMAT'))
+            }]
+        }
+    elif year_lookup and month_lookup:
+        days = histogram.days(int(year_lookup), int(month_lookup))
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year_lookup}),
+                'title': str(year_lookup)
+            },
+            'choices': [{
+                'link': link({year_field: year_lookup,
+                              month_field: month_lookup,
+                              day_field: day.day}),
+                'title': capfirst(formats.date_format(day,
+                                                      'MONTH_DAY_FORMAT'))
+            } for day in days]
+        }
+    elif year_lookup:
+        months = histogram.months(int(year_lookup))
+        return {
+            'show': True,
+            'back': {
+                'link': link({}),
+                'title': _('All dates')
+            },
+            'choices': [{
+                'link': link({year_field: year_lookup,
+                              month_field: month.month}),
+                'title': capfirst(formats.date_format(month,
+                                                      'YEAR_MONTH_FORMAT'))
+            } for month in months]
+        }
+    else:
+        return {
+            'show': True,
+            'choices': [{
+                'link': link({year_field: str(year)}),
+                'title': str(year),
+            } for year in histogram.years()]
+        }
@@ -0,0 +1,756 @@
+import datetime
+import json
+import operator
+import os
+import re
+import tempfile
+import time
+from functools import reduce
+
+import reversion
+import tablib
+
+from django.contrib import admin
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.db.models import Q
+from django.forms.models import ModelChoiceField
+from django.utils import six
+from django.utils.encoding import force_text
+from django.utils.http import urlencode
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.utils.unittest import skipUnless
+from reversion.models import Version
+
+from .admin import CountryInline, ImportExportItemResource
+from .caching import get_changelist_cache
+from .choices import CachedSelect, get_generation
+from .jobs import JOB_STALE_TIMEOUT, Job, get_job
+from .management.commands.benchmark_admin import FormDataParser
+from .models import Category, City, Continent, Country, ImportExportItem, \
+    KitchenSink, ReversionedItem
+from .search import has_search_table, search_table_name
+from .serializers import FORMAT as DELTA_FORMAT, decode
+
+
+def changelist_url(model):
+    return reverse('admin:%s_%s_changelist' % (model._meta.app_label,
+                                               model._meta.module_name))
+
+
+def change_url(obj):
+    return reverse('admin:%s_%s_change' % (obj._meta.app_label,
+                                           obj._meta.module_name),
+                   args=(obj.pk,))
+
+
+# Without the shared "changelist" cache pages are rendered on every request
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AdminTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+
+    def capture_queries(self, func):
+        use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        start = len(connection.queries)
+        try:
+            func()
+        finally:
+            connection.use_debug_cursor = use_debug_cursor
+        return [query['sql'] for query in connection.queries[start:]]
+
+    def count_queries(self, func):
+        return len(self.capture_queries(func))
+
+    def get_form_data(self, url):
+        """
+        Values a browser would post with the forms of url
+        """
+        parser = FormDataParser()
+        parser.feed(self.client.get(url).content.decode('utf-8'))
+        data = {}
+        for name, value in parser.data:
+            data.setdefault(name, []).append(value)
+        return data
+
+    def assertConstantQueries(self, func, grow):
+        """
+        Asserts func() runs as many queries after grow() as before. func()
+        runs once more before counting, so caches are filled
+        """
+        func()
+        count = self.count_queries(func)
+        grow()
+        func()
+        self.assertNumQueries(count, func)
+
+
+class SearchTextTest(AdminTestCase):
+    """
+    Search through search_text finds the same rows as icontains lookups on
+    the former search_fields
+    """
+
+    def setUp(self):
+        super(SearchTextTest, self).setUp()
+        europe = Continent.objects.create(name='Europe', order=1)
+        georgia = Country.objects.create(name='Big Georgia', code='GE',
+                                         continent=europe)
+        latvia = Country.objects.create(name='Latvia', code='LV',
+                                        continent=europe)
+        for name, country in (('Tbilisi', georgia), ('Riga', latvia),
+                              ('Georgetown', latvia)):
+            City.objects.create(name=name, country=country)
+        for name in ('Big sink', 'Riga sink'):
+            KitchenSink.objects.create(name=name, help_text='Help',
+                                       multiple_in_row='Row', country=latvia,
+                                       linked_foreign_key=latvia)
+
+    def assert_search_parity(self, model, fields, terms):
+        for term in terms:
+            response = self.client.get(changelist_url(model), {'q': term})
+            found = set(obj.pk for obj in response.context['cl'].query_set)
+            expected = model._default_manager.all()
+            for word in term.split():
+                expected = expected.filter(reduce(operator.or_, [
+                    Q(**{'%s__icontains' % field: word}) for field in fields]))
+            self.assertEqual(
+                found, set(expected.values_list('pk', flat=True)), term)
+
+    def test_country(self):
+        self.assert_search_parity(Country, ('name', 'code'), (
+            'georgia', 'GE', 'big lv', 'a', 'latvia lv', 'nothing'))
+
+    def test_city(self):
+        self.assert_search_parity(City, ('name', 'country__name'), (
+            'georgia', 'riga', 'big tbilisi', 'TOWN', 'lat', 'nothing'))
+
+    def test_kitchen_sink(self):
+        self.assert_search_parity(KitchenSink, ('name',), (
+            'sink', 'riga', 'big sink', 'nothing'))
+
+    def test_country_rename(self):
+        georgia = Country.objects.get(name='Big Georgia')
+        georgia.name = 'Georgia'
+        georgia.save()
+        city = City.objects.select_related('country').get(name='Tbilisi')
+        self.assertEqual(city.search_text, city.get_search_text())
+        self.assert_search_parity(City, ('name', 'country__name'), (
+            'big', 'georgia tbilisi'))
+
+    def test_country_save(self):
+        # Cities are rewritten on renames only
+        latvia = Country.objects.get(name='Latvia')
+        city_table = City._meta.db_table
+        self.assertFalse([sql for sql in self.capture_queries(latvia.save)
+                          if city_table in sql])
+
+    def test_search_table(self):
+        if not has_search_table(City):
+            self.skipTest('No SQLite FTS5 trigram search tables')
+        response = self.client.get(changelist_url(City), {'q': 'riga'})
+        self.assertIn(search_table_name(City),
+                      force_text(response.context['cl'].query_set.query))
+
+
+class ContinentChangeListTest(AdminTestCase):
+    def add_continents(self, count):
+        for i in range(Continent.objects.count(),
+                       Continent.objects.count() + count):
+            continent = Continent.objects.create(name='Continent %s' % i,
+                                                 order=i)
+            for j in range(3):
+                Country.objects.create(name='Country %s %s' % (i, j),
+                                       code='CC', continent=continent)
+
+    def test_countries_count(self):
+        self.add_continents(3)
+        self.assertConstantQueries(
+            lambda: self.client.get(changelist_url(Continent)),
+            lambda: self.add_continents(30))
+        response = self.client.get(changelist_url(Continent))
+        self.assertEqual(
+            [continent.countries_count for continent in
+             response.context['cl'].result_list], [3] * 33)
+
+
+class CityChangeListTest(AdminTestCase):
+    def setUp(self):
+        super(CityChangeListTest, self).setUp()
+        europe = Continent.objects.create(name='Europe', order=1)
+        # Cities of countries without continent too
+        self.countries = [
+            Country.objects.create(name='Country %s' % i, code='CC',
+                                   continent=europe if i % 2 else None)
+            for i in range(10)]
+        self.model_admin = admin.site._registry[City]
+        self.list_per_page = self.model_admin.list_per_page
+        self.model_admin.list_per_page = 1000
+
+    def tearDown(self):
+        self.model_admin.list_per_page = self.list_per_page
+
+    def add_cities(self, count):
+        cities = []
+        for i in range(City.objects.count(), City.objects.count() + count):
+            city = City(name='City %s' % i,
+                        country=self.countries[i % len(self.countries)])
+            city.search_text = city.get_search_text()
+            cities.append(city)
+        City.objects.bulk_create(cities)
+
+    def test_changelist(self):
+        self.add_cities(100)
+        self.assertConstantQueries(
+            lambda: self.client.get(changelist_url(City)),
+            lambda: self.add_cities(900))
+        response = self.client.get(changelist_url(City))
+        self.assertEqual(len(response.context['cl'].result_list), 1000)
+
+    def test_country_filter(self):
+        self.add_cities(100)
+        url = '%s?country=%s' % (changelist_url(City), self.countries[0].pk)
+        self.assertConstantQueries(lambda: self.client.get(url),
+                                   lambda: self.add_cities(900))
+
+    def test_restricted_queryset(self):
+        self.add_cities(100)
+        queryset = self.model_admin.queryset
+        self.model_admin.queryset = lambda request: queryset(request).filter(
+            country=self.countries[0])
+        self.addCleanup(delattr, self.model_admin, 'queryset')
+        # Totals count the rows ModelAdmin.queryset() lets through
+        for country, count in ((None, 10), (self.countries[1], 0)):
+            params = {'country': country.pk} if country else {}
+            cl = self.client.get(changelist_url(City), params).context['cl']
+            self.assertEqual((cl.result_count, cl.full_result_count),
+                             (count, 10))
+
+
+class CategorySaveTest(AdminTestCase):
+    def add_categories(self, count):
+        start = Category.objects.count()
+        root = Category.objects.create(name='Root %s' % start, slug='root',
+                                       order=start)
+        for i in range(start + 1, start + count):
+            Category.objects.create(name='Category %s' % i, slug='category',
+                                    parent=root, order=i)
+
+    def test_rename(self):
+        self.add_categories(10)
+        category = Category.objects.order_by('pk')[1]
+        tree = list(Category.objects.order_by('pk').values_list(
+            'tree_id', 'lft', 'rght', 'level'))
+
+        def rename():
+            category.name += ' renamed'
+            category.save()
+        # Saves don't rebuild the tree, so they cost the same for any size
+        self.assertConstantQueries(rename, lambda: self.add_categories(100))
+        self.assertEqual(list(Category.objects.order_by('pk').values_list(
+            'tree_id', 'lft', 'rght', 'level'))[:10], tree)
+
+
+class CategoryReorderTest(AdminTestCase):
+    def setUp(self):
+        super(CategoryReorderTest, self).setUp()
+        self.roots = [Category.objects.create(name=name, slug=name,
+                                              order=order)
+                      for name, order in (('A', 1024), ('B', 2048))]
+        self.children = [
+            Category.objects.create(name=name, slug=name, order=order,
+                                    parent=self.roots[0])
+            for name, order in (('A1', 1), ('A2', 2), ('A3', 3))]
+
+    def reorder(self, *moves):
+        response = self.client.post(
+            reverse('admin:examples_category_reorder'),
+            json.dumps({'moves': moves}), content_type='application/json')
+        return json.loads(response.content.decode('utf-8'))['changed']
+
+    def get_tree(self):
+        return [(node.name, node.level) for node in
+                Category.objects.order_by('tree_id', 'lft')]
+
+    def test_move_after_renumbers(self):
+        model_admin = admin.site._registry[Category]
+        first, second, third = self.children
+        # No value fits between 1 and 2, so all siblings are renumbered
+        self.assertEqual(model_admin.move_after(third, first.pk), 3)
+        self.assertEqual(list(Category.objects.filter(
+            parent=self.roots[0]).order_by('order').values_list(
+            'name', 'order')), [('A1', 1024), ('A3', 2048), ('A2', 3072)])
+
+    def test_reorder_children(self):
+        self.assertEqual(self.reorder([self.children[2].pk, None]), 1)
+        self.assertEqual(self.get_tree(), [
+            ('A', 0), ('A3', 1), ('A1', 1), ('A2', 1), ('B', 0)])
+
+    def test_reorder_roots(self):
+        self.reorder([self.roots[0].pk, self.roots[1].pk])
+        self.assertEqual(self.get_tree(), [
+            ('B', 0), ('A', 0), ('A1', 1), ('A2', 1), ('A3', 1)])
+        root = Category.objects.get(name='A')
+        self.assertEqual((root.lft, root.rght), (1, 8))
+
+
+class SortableInlineTest(AdminTestCase):
+    def setUp(self):
+        super(SortableInlineTest, self).setUp()
+        self.continent = Continent.objects.create(name='Europe', order=1)
+        self.inline_per_page = CountryInline.inline_per_page
+        CountryInline.inline_per_page = 250
+
+    def tearDown(self):
+        CountryInline.inline_per_page = self.inline_per_page
+
+    def add_countries(self, count):
+        start = Country.objects.count()
+        for i in range(start, start + count):
+            Country.objects.create(name='Country %s' % i, code='CC',
+                                   continent=self.continent, order=i)
+
+    def get_save(self, reverse, page=1):
+        """
+        Returns a function posting the change form with rows numbered from
+        zero in their shown or reversed order, like Suit does on submit
+        """
+        url = '%s?country_set-page=%s' % (change_url(self.continent), page)
+        data = self.get_form_data(url)
+        data['_save'] = ['Save']
+        count = int(data['country_set-INITIAL_FORMS'][0])
+        for i in range(count):
+            data['country_set-%s-order' % i] = [
+                str(count - 1 - i if reverse else i)]
+        return lambda: self.client.post(url, data)
+
+    def get_shown_order(self):
+        return list(Country.objects.order_by('order').values_list(
+            'pk', flat=True))
+
+    def test_reorder(self):
+        self.add_countries(25)
+        count = self.count_queries(self.get_save(reverse=True))
+        self.add_countries(225)
+        shown = self.get_shown_order()
+        self.assertNumQueries(count, self.get_save(reverse=True))
+        self.assertEqual(self.get_shown_order(), shown[::-1])
+
+    def test_unchanged(self):
+        self.add_countries(25)
+        count = self.count_queries(self.get_save(reverse=False))
+        self.add_countries(225)
+        orders = dict(Country.objects.values_list('pk', 'order'))
+        self.assertNumQueries(count, self.get_save(reverse=False))
+        self.assertEqual(dict(Country.objects.values_list('pk', 'order')),
+                         orders)
+
+    def test_reorder_page(self):
+        CountryInline.inline_per_page = 10
+        self.add_countries(25)
+        shown = self.get_shown_order()
+        response = self.get_save(reverse=True, page=2)()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.get_shown_order(),
+                         shown[:10] + shown[10:20][::-1] + shown[20:])
+
+
+class BulkListEditableTest(AdminTestCase):
+    def setUp(self):
+        super(BulkListEditableTest, self).setUp()
+        self.country = Country.objects.create(name='Latvia', code='LV')
+        self.model_admin = admin.site._registry[KitchenSink]
+        self.list_per_page = self.model_admin.list_per_page
+        self.model_admin.list_per_page = 500
+
+    def tearDown(self):
+        self.model_admin.list_per_page = self.list_per_page
+
+    def add_sinks(self, count):
+        sinks = []
+        for i in range(KitchenSink.objects.count(),
+                       KitchenSink.objects.count() + count):
+            sink = KitchenSink(name='Sink %s' % i, help_text='Help',
+                               multiple_in_row='Row', boolean=bool(i % 2),
+                               country=self.country,
+                               linked_foreign_key=self.country)
+            sink.search_text = sink.get_search_text()
+            sinks.append(sink)
+        KitchenSink.objects.bulk_create(sinks)
+
+    def get_toggle(self):
+        """
+        Returns a function posting the changelist with every boolean toggled
+        """
+        url = changelist_url(KitchenSink)
+        data = self.get_form_data(url)
+        data['_save'] = ['Save']
+        for i in range(int(data['form-TOTAL_FORMS'][0])):
+            if data.pop('form-%s-boolean' % i, None) is None:
+                data['form-%s-boolean' % i] = ['on']
+        return lambda: self.client.post(url, data)
+
+    def capture_unlogged_queries(self, func):
+        # LogEntry rows are inserted in batches of the database parameter
+        # limit, e.g. 142 rows per query on SQLite
+        return [sql for sql in self.capture_queries(func)
+                if not (sql.startswith('INSERT') and
+                        LogEntry._meta.db_table in sql)]
+
+    def test_toggle(self):
+        self.add_sinks(50)
+        queries = self.capture_unlogged_queries(self.get_toggle())
+        self.add_sinks(450)
+        values = dict(KitchenSink.objects.values_list('pk', 'boolean'))
+        self.assertEqual(
+            len(self.capture_unlogged_queries(self.get_toggle())),
+            len(queries))
+        self.assertEqual(LogEntry.objects.count(), 550)
+        self.assertEqual(
+            dict(KitchenSink.objects.values_list('pk', 'boolean')),
+            dict((pk, not value) for pk, value in values.items()))
+
+
+@skipUnless(connection.vendor == 'sqlite',
+            'Plans are read with EXPLAIN QUERY PLAN of SQLite')
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class IndexUsageTest(TransactionTestCase):
+    """
+    Every changelist filter and date_hierarchy query of the example admins
+    and sortable inlines are served by indexes. PRAGMA and EXPLAIN commit on
+    SQLite, so tests don't run in a transaction
+    """
+
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+        europe = Continent.objects.create(name='Europe', order=1)
+        country = Country.objects.create(
+            name='Latvia', code='LV', continent=europe,
+            independence_day=datetime.date(2000, 5, 1))
+        City.objects.create(name='Riga', country=country, capital=True)
+        KitchenSink.objects.create(name='Sink', help_text='Help',
+                                   multiple_in_row='Row', country=country,
+                                   linked_foreign_key=country,
+                                   date=datetime.date.today())
+
+    def get_example_admins(self):
+        return [(model, model_admin) for model, model_admin in
+                admin.site._registry.items()
+                if model._meta.app_label == Country._meta.app_label]
+
+    def get_index(self, model, *fields):
+        columns = [model._meta.get_field(name).column for name in fields]
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA index_list(%s)' % qn(model._meta.db_table))
+        for index in cursor.fetchall():
+            cursor.execute('PRAGMA index_info(%s)' % qn(index[1]))
+            if [info[2] for info in sorted(cursor.fetchall())] == columns:
+                return index[1]
+        self.fail('No index on %s%r' % (model._meta.db_table, fields))
+
+    def explain(self, queryset):
+        sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN %s' % sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, queryset, model, *fields):
+        name = self.get_index(model, *fields)
+        plan = self.explain(queryset)
+        self.assertTrue(any(
+            re.search(r'USING (COVERING )?INDEX %s\b' % re.escape(name), line)
+            for line in plan), plan)
+
+    def assertSearchesTable(self, queryset, model, msg):
+        """
+        Rows of model are looked up in an index, the table is not scanned
+        """
+        plan = self.explain(queryset)
+        self.assertTrue(any(
+            re.match(r'SEARCH (TABLE )?%s USING ' % re.escape(
+                model._meta.db_table), line)
+            for line in plan), (msg, plan))
+
+    def get_changelist(self, model, query_string=''):
+        return self.client.get(changelist_url(model) + query_string).context[
+            'cl']
+
+    def test_changelist_filters(self):
+        for model, model_admin in self.get_example_admins():
+            cl = self.get_changelist(model)
+            for spec in cl.filter_specs:
+                for choice in spec.choices(cl):
+                    # "All" choices don't filter
+                    if choice['query_string'] == '?':
+                        continue
+                    self.assertSearchesTable(self.get_changelist(
+                        model, choice['query_string']).query_set, model,
+                        choice['query_string'])
+
+    def test_date_hierarchy(self):
+        for model, model_admin in self.get_example_admins():
+            field = model_admin.date_hierarchy
+            if not field:
+                continue
+            day = model._default_manager.exclude(**{
+                field: None}).values_list(field, flat=True)[0]
+            params = {}
+            for lookup, value in (('year', day.year), ('month', day.month),
+                                  ('day', day.day)):
+                params['%s__%s' % (field, lookup)] = value
+                self.assertSearchesTable(self.get_changelist(
+                    model, '?%s' % urlencode(params)).query_set, model,
+                    params)
+
+    def test_sortable_inline(self):
+        continent = Continent.objects.get()
+        response = self.client.get(change_url(continent))
+        formset = [inline.formset for inline in
+                   response.context['inline_admin_formsets']
+                   if inline.formset.model is Country][0]
+        self.assertUsesIndex(formset.paginator.object_list, Country,
+                             'continent', 'order')
+
+
+def import_dataset(rows, **options):
+    dataset = tablib.Dataset(headers=['id', 'name', 'quality', 'is_active'])
+    for row in rows:
+        dataset.append(row)
+    resource = ImportExportItemResource()
+    resource.batch_size = options.pop('batch_size', resource.batch_size)
+    return resource.import_data(dataset, **options)
+
+
+class BulkImportTest(AdminTestCase):
+    def test_matching(self):
+        renamed = ImportExportItem.objects.create(name='A', quality=1)
+        ImportExportItem.objects.create(name='B', quality=1)
+        result = import_dataset([
+            (str(renamed.pk), 'Renamed', '2', '1'),
+            ('', 'B', '3', '0'),
+            ('9999', 'C', '4', '1'),
+            ('', 'D', '1', '0'),
+        ], batch_size=2)
+        self.assertFalse(result.has_errors())
+        self.assertEqual(result.totals, {'new': 2, 'update': 2})
+        self.assertEqual(
+            sorted(ImportExportItem.objects.values_list('name', 'quality')),
+            [('B', 3), ('C', 4), ('D', 1), ('Renamed', 2)])
+        self.assertEqual(ImportExportItem.objects.get(pk=renamed.pk).name,
+                         'Renamed')
+        # Unknown ids are kept, like stock imports do
+        self.assertEqual(ImportExportItem.objects.get(pk=9999).name, 'C')
+
+    def test_invalid_row(self):
+        result = import_dataset([('', 'A', '1', '1'), ('', 'B', 'x', '1')])
+        self.assertTrue(result.has_errors())
+        self.assertIn('Line 2', result.base_errors[0].error)
+        self.assertEqual(ImportExportItem.objects.count(), 0)
+
+    def add_items(self, count):
+        start = ImportExportItem.objects.count()
+        ImportExportItem.objects.bulk_create([
+            ImportExportItem(name='Item %s' % i)
+            for i in range(start, start + count)])
+
+    def update_all(self):
+        import_dataset([('', name, '2', '1') for name in
+                        ImportExportItem.objects.values_list('name',
+                                                             flat=True)])
+
+    def test_constant_queries(self):
+        # A batch is one lookup and one UPDATE per distinct set of values
+        self.add_items(50)
+        count = self.count_queries(self.update_all)
+        self.add_items(450)
+        self.assertNumQueries(count, self.update_all)
+        self.assertEqual(
+            ImportExportItem.objects.filter(quality=2).count(), 500)
+
+
+class BulkImportTransactionTest(TransactionTestCase):
+    """
+    TestCase turns transaction commits and rollbacks into no-ops
+    """
+    rows = [('', 'A', '1', '1'), ('', 'B', '1', '1'), ('', 'C', 'x', '1')]
+
+    def test_rollback(self):
+        result = import_dataset(self.rows, batch_size=2,
+                                use_transactions=True)
+        self.assertTrue(result.has_errors())
+        self.assertEqual(ImportExportItem.objects.count(), 0)
+
+    def test_without_transactions(self):
+        # Batches before the failing one stay imported
+        result = import_dataset(self.rows, batch_size=2,
+                                use_transactions=False)
+        self.assertTrue(result.has_errors())
+        self.assertEqual(ImportExportItem.objects.count(), 2)
+
+
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'changelist': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'changelist'},
+}
+
+
+@override_settings(CACHES=SHARED_CACHES, EXAMPLES_JOBS_INLINE=True)
+class BackgroundJobTest(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+        for name in ('A', 'B', 'C'):
+            ImportExportItem.objects.create(name=name)
+
+    def url(self, view, *args):
+        return reverse('admin:examples_importexportitem_%s' % view,
+                       args=args)
+
+    def get_job_ids(self):
+        return self.client.session['examples_jobs_importexportitem']
+
+    def test_export(self):
+        self.client.get(self.url('export_job'))
+        job_id, = self.get_job_ids()
+        job = json.loads(self.client.get(
+            self.url('job', job_id)).content.decode('utf-8'))
+        self.assertEqual((job['status'], job['done'], job['total']),
+                         ('done', 3, 3))
+        export_file = get_job(job_id)['result']['file']
+        response = self.client.get(self.url('job_download', job_id))
+        lines = b''.join(response.streaming_content).splitlines()
+        response.close()
+        self.assertEqual(len(lines), 4)
+        self.assertFalse(os.path.exists(export_file))
+        self.assertEqual(
+            self.client.get(self.url('job_download', job_id)).status_code,
+            404)
+
+    def test_import(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
+            f.write(b'id,name,quality,is_active\n,D,2,1\n,A,3,0\n')
+        self.addCleanup(os.remove, f.name)
+        self.client.post(self.url('process_import'), {
+            'import_file_name': f.name, 'input_format': '0'})
+        job_id, = self.get_job_ids()
+        job = get_job(job_id)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result'], {'new': 1, 'update': 1})
+        self.assertEqual(ImportExportItem.objects.get(name='A').quality, 3)
+        self.assertTrue(ImportExportItem.objects.filter(name='D').exists())
+
+    def test_stale_job(self):
+        job = Job('export')
+        job.state['status'] = 'running'
+        job.save()
+        key = 'examples:job:%s' % job.id
+        cache = get_changelist_cache()
+        cache.set(key, dict(cache.get(key), updated=time.time() -
+                            JOB_STALE_TIMEOUT - 1))
+        self.assertEqual(get_job(job.id)['status'], 'failed')
+
+    def test_without_shared_cache(self):
+        # Exports are streamed in the request instead
+        with override_settings(CACHES={'default': SHARED_CACHES['default']}):
+            response = self.client.get(self.url('export_job'))
+        self.assertTrue(response['Location'].endswith(
+            '%s?format=csv' % self.url('export_stream')))
+
+
+class DeltaVersionTest(AdminTestCase):
+    def test_admin_save(self):
+        self.client.post(reverse('admin:examples_reversioneditem_add'),
+                         {'name': 'Item', 'quality': 1})
+        item = ReversionedItem.objects.get()
+        for quality in (2, 3):
+            self.client.post(change_url(item), {'name': 'Item',
+                                                'quality': quality})
+        versions = list(Version.objects.filter(
+            object_id_int=item.pk).order_by('pk'))
+        self.assertEqual([version.format for version in versions],
+                         [DELTA_FORMAT] * 3)
+        self.assertEqual(decode(versions[-1].serialized_data)['objects'],
+                         [{'fields': {'quality': 3}}])
+        self.assertEqual([version.object_version.object.quality
+                          for version in versions], [1, 2, 3])
+
+    def test_history_view(self):
+        item = ReversionedItem.objects.create(name='Item')
+        url = reverse('admin:examples_reversioneditem_history',
+                      args=(item.pk,))
+
+        def add_versions(count=1):
+            for quality in range(count):
+                with reversion.create_revision():
+                    item.quality = quality % 3 + 1
+                    item.save()
+
+        def history():
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        add_versions()
+        self.assertConstantQueries(history, lambda: add_versions(60))
+        for sql in self.capture_queries(history):
+            self.assertNotIn('serialized_data', sql)
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class CachedSelectTest(TestCase):
+    def setUp(self):
+        # Generations of earlier tests may match cached options
+        get_changelist_cache().clear()
+        self.countries = [Country.objects.create(name=name, code=code)
+                          for name, code in (('Latvia', 'LV'),
+                                             ('Georgia', 'GE'))]
+
+    def render(self, value, widget=None):
+        field = ModelChoiceField(Country.objects.all(), widget=widget)
+        return field.widget.render('country', value)
+
+    def test_render(self):
+        for country in self.countries:
+            self.assertEqual(self.render(country.pk, CachedSelect),
+                             self.render(country.pk))
+        # Options are cached, the selected one is rendered on every call
+        self.assertNumQueries(0, lambda: self.render(None, CachedSelect))
+        self.assertEqual(self.render(None, CachedSelect), self.render(None))
+        Country.objects.create(name='Estonia', code='EE')
+        self.assertIn('Estonia', self.render(None, CachedSelect))
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class GenerateExamplesTest(TestCase):
+    def setUp(self):
+        get_changelist_cache().clear()
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+
+    def get_country_lookups(self):
+        cl = self.client.get(changelist_url(City)).context['cl']
+        return [name for pk, name in cl.filter_specs[0].lookup_choices]
+
+    def test_caches_dropped(self):
+        latvia = Country.objects.create(name='Latvia', code='LV')
+        City.objects.create(name='Riga', country=latvia)
+        self.assertEqual(self.get_country_lookups(), ['Latvia'])
+        georgia = Country.objects.create(name='Georgia', code='GE')
+        self.assertEqual(self.get_country_lookups(), ['Latvia'])
+        generation = get_generation()
+        # Rows of generate_examples are bulk created like this one
+        City.objects.bulk_create([City(name='Tbilisi', country=georgia)])
+        call_command('generate_examples', scale=0, history=0,
+                     stdout=six.StringIO())
+        self.assertEqual(self.get_country_lookups(), ['Georgia', 'Latvia'])
+        self.assertTrue(get_generation() > generation)
@@ -0,0 +1,222 @@
+"""
+Lazy tree changelist for MPTTModelAdmin.
+
+MPTTModelAdmin renders the whole tree on the changelist. LazyTreeMixin shows
+only nodes up to tree_initial_level and loads children of a node when it is
+expanded, from a <id>/children/ view which reads the node's lft/rght range.
+Searched or filtered changelists show the matched nodes of the page together
+with their ancestors, fetched in the same query. Loaded children come with
+list_editable inputs, which join the changelist formset, so a posted
+changelist is built from the posted rows.
+"""
+import json
+import operator
+from functools import reduce
+
+from django import forms
+from django.conf.urls import patterns, url
+from django.contrib.admin.util import quote
+from django.contrib.admin.views.main import ALL_VAR, IS_POPUP_VAR, \
+    ORDER_TYPE_VAR, ORDER_VAR, TO_FIELD_VAR
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.urlresolvers import reverse
+from django.db.models import Q
+from django.forms.formsets import BaseFormSet
+from django.http import HttpResponse, Http404
+from django.utils.encoding import force_text
+from django.utils.safestring import mark_safe
+from mptt.admin import MPTTChangeList
+from mptt.templatetags.mptt_admin import mptt_items_for_result
+
+#: parameters that don't filter the changelist
+NON_FILTER_VARS = (ALL_VAR, IS_POPUP_VAR, ORDER_TYPE_VAR, ORDER_VAR,
+                   TO_FIELD_VAR)
+
+
+class LazyTreeChangeList(MPTTChangeList):
+    def is_tree_filtered(self):
+        return bool(self.query) or any(name not in NON_FILTER_VARS
+                                       for name in self.params)
+
+    def get_posted_pks(self, request):
+        """
+        Primary keys of posted changelist formset rows, None if not posted
+        """
+        if request.method != 'POST' or not self.list_editable:
+            return None
+        prefix = BaseFormSet.get_default_prefix()
+        pk = self.lookup_opts.pk
+        try:
+            total = int(request.POST['%s-TOTAL_FORMS' % prefix])
+        except (KeyError, ValueError):
+            return None
+        pks = []
+        for index in range(total):
+            try:
+                pks.append(pk.to_python(request.POST.get(
+                    '%s-%s-%s' % (prefix, index, pk.name))))
+            except ValidationError:
+                pass
+        return [value for value in pks if value is not None]
+
+    def get_query_set(self, request):
+        qs = super(LazyTreeChangeList, self).get_query_set(request)
+        # Posted actions and rows may be loaded children
+        if not self.is_tree_filtered() and request.method != 'POST':
+            qs = qs.filter(**{
+                '%s__lte' % self.model._mptt_meta.level_attr:
+                    self.model_admin.tree_initial_level
+            })
+        return qs
+
+    def get_results(self, request):
+        super(LazyTreeChangeList, self).get_results(request)
+        opts = self.model._mptt_meta
+        pks = self.get_posted_pks(request)
+        if pks is not None:
+            self.result_list = self.root_query_set.filter(
+                pk__in=pks).order_by(opts.tree_id_attr, opts.left_attr)
+            return
+        if not self.is_tree_filtered():
+            return
+        # Show path to every matched node of the page
+        nodes = list(self.result_list)
+        if not nodes:
+            return
+        ancestors = reduce(operator.or_, [Q(**{
+            opts.tree_id_attr: getattr(node, opts.tree_id_attr),
+            '%s__lt' % opts.left_attr: getattr(node, opts.left_attr),
+            '%s__gt' % opts.right_attr: getattr(node, opts.right_attr),
+        }) for node in nodes if getattr(node, opts.level_attr)], Q(pk__in=[
+            node.pk for node in nodes]))
+        self.result_list = self.root_query_set.filter(ancestors).order_by(
+            opts.tree_id_attr, opts.left_attr)
+
+
+class ChildRows(object):
+    """
+    Just enough of ChangeList to render rows with mptt_items_for_result.
+    Forms are numbered from zero, lazy_tree.js numbers them again when rows
+    are added to the changelist
+    """
+    to_field = None
+    is_popup = False
+
+    def __init__(self, model_admin, list_display, list_display_links,
+                 formset=None):
+        self.model = model_admin.model
+        self.lookup_opts = model_admin.model._meta
+        self.model_admin = model_admin
+        self.list_display = list_display
+        self.list_display_links = list_display_links
+        self.formset = formset
+
+    def url_for_result(self, result):
+        info = self.lookup_opts.app_label, self.lookup_opts.module_name
+        return reverse('admin:%s_%s_change' % info,
+                       args=(quote(result.pk),),
+                       current_app=self.model_admin.admin_site.name)
+
+    def get_form(self, result, index):
+        if self.formset is None:
+            return None
+        pk = self.lookup_opts.pk.name
+        form = self.formset.form(instance=result, initial={pk: result.pk},
+                                 prefix=self.formset.add_prefix(index))
+        self.formset.add_fields(form, index)
+        return form
+
+    def render(self, result, index):
+        form = self.get_form(result, index)
+        items = [force_text(item)
+                 for item in mptt_items_for_result(self, result, form)]
+        if form is not None:
+            # Hidden pk is rendered outside rows on the changelist, keep it
+            # in the last cell here
+            hidden = ''.join(force_text(field) for field in form
+                             if field.is_hidden)
+            end = items[-1].rfind('</')
+            items[-1] = items[-1][:end] + hidden + items[-1][end:]
+        return mark_safe('<tr>%s</tr>' % ''.join(items))
+
+
+class LazyTreeMixin(object):
+    """
+    Use before MPTTModelAdmin in bases
+    """
+    #: deepest level rendered on the changelist before expanding
+    tree_initial_level = 0
+    #: number of children returned per children/ request
+    tree_children_per_page = 500
+
+    @property
+    def media(self):
+        # Media class of another mixin before this one would shadow ours
+        return super(LazyTreeMixin, self).media + forms.Media(
+            js=('js/lazy_tree.js',))
+
+    def get_urls(self):
+        urls = super(LazyTreeMixin, self).get_urls()
+        info = self.model._meta.app_label, self.model._meta.module_name
+        my_urls = patterns(
+            '',
+            url(r'^(\d+)/children/$',
+                self.admin_site.admin_view(self.children_view),
+                name='%s_%s_children' % info),
+        )
+        return my_urls + urls
+
+    def get_changelist(self, request, **kwargs):
+        return LazyTreeChangeList
+
+    def get_list_display(self, request):
+        return ['tree_toggle'] + list(
+            super(LazyTreeMixin, self).get_list_display(request))
+
+    def tree_toggle(self, obj):
+        opts = obj._mptt_meta
+        level = getattr(obj, opts.level_attr)
+        if getattr(obj, opts.right_attr) - getattr(obj, opts.left_attr) > 1:
+            return ('<a href="#" class="tree-toggle" data-id="%s" '
+                    'data-level="%s">+</a>' % (obj.pk, level))
+        return '<span class="tree-toggle" data-level="%s"></span>' % level
+    tree_toggle.allow_tags = True
+    tree_toggle.short_description = ''
+
+    def children_view(self, request, object_id):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        opts = self.model._mptt_meta
+        try:
+            node = self.queryset(request).get(pk=object_id)
+            after = int(request.GET.get('after',
+                                        getattr(node, opts.left_attr)))
+        except (self.model.DoesNotExist, ValueError):
+            raise Http404
+        children = list(self.queryset(request).filter(**{
+            opts.tree_id_attr: getattr(node, opts.tree_id_attr),
+            opts.level_attr: getattr(node, opts.level_attr) + 1,
+            '%s__gt' % opts.left_attr: after,
+            '%s__lt' % opts.right_attr: getattr(node, opts.right_attr),
+        }).order_by(opts.left_attr)[:self.tree_children_per_page + 1])
+        more = len(children) > self.tree_children_per_page
+        children = children[:self.tree_children_per_page]
+
+        list_display = self.get_list_display(request)
+        if self.get_actions(request):
+            list_display = ['action_checkbox'] + list_display
+        list_display_links = self.list_display_links or [
+            name for name in list_display
+            if name not in ('action_checkbox', 'tree_toggle')][:1]
+        formset = None
+        if self.list_editable:
+            FormSet = self.get_changelist_formset(request)
+            formset = FormSet(queryset=self.model._default_manager.none())
+        rows = ChildRows(self, list_display, list_display_links, formset)
+        data = {
+            'rows': [force_text(rows.render(child, index))
+                     for index, child in enumerate(children)],
+            'after': getattr(children[-1], opts.left_attr) if more else None,
+        }
+        return HttpResponse(json.dumps(data),
+                            content_type='application/json')